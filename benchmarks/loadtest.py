@@ -0,0 +1,204 @@
+"""
+Load test of the index endpoint without touching real restaurant sites
+
+A local replay server serves the recorded pages from benchmarks/fixtures
+with configurable latency, jitter and failure rate, and acts as the
+Slack hook. The app scrapes from it and is driven by many concurrent
+clients. Run from the repository root:
+
+    python -m benchmarks.loadtest --requests 500 --concurrency 50 --cold
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.run import FIXTURES, load_fixture
+
+SECRET_KEY = "loadtest"
+
+
+class ReplayServer:
+    """
+    Stand-in for restaurant sites and the Slack hook
+    """
+
+    def __init__(self, latency=0.1, jitter=0.05, failure_rate=0.0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.pages = {}
+        for restaurant_cls, _ in FIXTURES.items():
+            url = urlparse(restaurant_cls(None).url)
+            self.pages[url.netloc + url.path] = load_fixture(restaurant_cls)
+        self.slack_posts = 0
+        self.app = web.Application()
+        self.app.router.add_post("/slack", self.slack)
+        self.app.router.add_get("/{path:.*}", self.page)
+
+    async def delay(self):
+        low = max(0, self.latency - self.jitter)
+        await asyncio.sleep(random.uniform(low, self.latency + self.jitter))
+
+    async def page(self, request):
+        await self.delay()
+        if random.random() < self.failure_rate:
+            raise web.HTTPServiceUnavailable()
+        body = self.pages.get(request.match_info["path"])
+        if body is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=body, content_type="text/html")
+
+    async def slack(self, request):
+        await self.delay()
+        self.slack_posts += 1
+        return web.Response(text="ok")
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+async def start_site(app, port=0):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner, "http://127.0.0.1:{}".format(runner.addresses[0][1])
+
+
+async def drive(base_url, path, requests, concurrency, before_request=None):
+    """
+    Send `requests` GETs to path from `concurrency` clients
+    """
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client(session):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            if before_request:
+                before_request()
+            start = time.perf_counter()
+            try:
+                async with session.get(base_url + path) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[client(session) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def load_test(args):
+    replay = ReplayServer(args.latency, args.jitter, args.failure_rate)
+    replay_runner, replay_url = await start_site(replay.app)
+
+    # The app reads its configuration at import time.
+    os.environ["SCRAPE_BASE_URL"] = replay_url
+    os.environ["SLACK_HOOK"] = replay_url + "/slack"
+    os.environ["SECRET_KEY"] = SECRET_KEY
+    os.environ["PREFETCH_TIMES"] = ""
+    os.environ.setdefault("HTTP_CACHE_DIR", tempfile.mkdtemp())
+    os.environ.setdefault(
+        "SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "menus.json")
+    )
+    os.environ.setdefault(
+        "HISTORY_PATH", os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+    )
+    os.environ.setdefault("SLACK_QUEUE_DIR", tempfile.mkdtemp())
+    # Every request of a --cold run has to scrape.
+    os.environ.setdefault("SHARED_CACHE", "")
+    import main
+
+    main.is_work_day = lambda: True
+    app_runner, app_url = await start_site(main.app)
+
+    def forget_menus():
+        # Everything but the HTTP cache on disk, as after a restart.
+        for cache in main.app["menu_caches"].values():
+            cache.forget()
+        main.app["scrape_scheduler"].forget()
+        main.app["cached_session"].parsed.clear()
+        main.WeeklyMenuMixin.weekly_menus.clear()
+        main.WeeklyMenuMixin.refetched_at.clear()
+        main.SafeRestaurant.breakers.clear()
+
+    try:
+        results = []
+        for path in ["/", "/" + SECRET_KEY]:
+            results.append(
+                await drive(
+                    app_url,
+                    path,
+                    args.requests,
+                    args.concurrency,
+                    forget_menus if args.cold else None,
+                )
+            )
+        await main.app["slack_queue"].join()
+    finally:
+        await app_runner.cleanup()
+        await replay_runner.cleanup()
+
+    for result in results:
+        print(
+            "{path:12} {requests:6} req {errors:4} err {throughput_rps:8.1f} req/s "
+            "p50 {p50_ms:8.1f} ms  p95 {p95_ms:8.1f} ms  p99 {p99_ms:8.1f} ms".format(
+                **result
+            )
+        )
+    print("Slack posts: {}".format(replay.slack_posts))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="forget menus, parsed pages and circuits before each request",
+    )
+    args = parser.parse_args(argv)
+
+    asyncio.run(load_test(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Offline benchmarks of menu parsing and formatting
+
+Every scraper parses its recorded page from benchmarks/fixtures, so no
+network is needed. Run from the repository root:
+
+    python -m benchmarks.run [--output FILE] [--baseline FILE] [--save-baseline]
+
+Results are written as JSON. With a stored baseline the run fails when a
+case is slower than the baseline by more than --threshold.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+
+import slack
+from restaurants import (
+    AvalonRestaurant,
+    CityCantinaRosumRestaurant,
+    DonQuijoteRestaurant,
+    DreamsRestaurant,
+    FormattedMenus,
+    GastrohouseRestaurant,
+    KantinaRestaurant,
+    Menu,
+    MenuUJelena,
+    MonastikRestaurant,
+    OlivaRestaurant,
+    PlzenskaBranaRestaurant,
+    TOTOCantinaRestaurant,
+    TOTOPizzaAndGrillRestaurant,
+    TOTORestaurant,
+    WeeklyMenuMixin,
+    parse_page,
+    parse_week_page,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, "fixtures")
+DEFAULT_OUTPUT = os.path.join(HERE, "results.json")
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+
+FIXTURES = {
+    AvalonRestaurant: "avalon.html",
+    CityCantinaRosumRestaurant: "city_cantina_rosum.html",
+    DonQuijoteRestaurant: "don_quijote.html",
+    DreamsRestaurant: "dreams.html",
+    GastrohouseRestaurant: "gastrohouse.html",
+    KantinaRestaurant: "kantina.html",
+    MenuUJelena: "menu_u_jelena.html",
+    MonastikRestaurant: "monastik.html",
+    OlivaRestaurant: "oliva.html",
+    PlzenskaBranaRestaurant: "plzenska_brana.html",
+    TOTOCantinaRestaurant: "toto_cantina.html",
+    TOTOPizzaAndGrillRestaurant: "toto_pizza.html",
+    TOTORestaurant: "toto.html",
+}
+
+
+def load_fixture(restaurant_cls) -> str:
+    with open(
+        os.path.join(FIXTURES_DIR, FIXTURES[restaurant_cls]), encoding="utf-8"
+    ) as f:
+        return f.read()
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Timing of `repeat` calls and memory of one call of func
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = after.compare_to(before, "filename")
+
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "peak_bytes": peak - base,
+        "retained_bytes": current - base,
+        "retained_blocks": sum(stat.count_diff for stat in retained),
+    }
+
+
+def cases():
+    """
+    Yield (name, function) of every benchmarked operation
+    """
+    menus = [Menu("Iné")]
+    for restaurant_cls in FIXTURES:
+        body = load_fixture(restaurant_cls)
+        name = restaurant_cls.__name__
+        yield "parse_menu[{}]".format(name), partial(
+            parse_page, body, restaurant_cls, 0
+        )
+        if issubclass(restaurant_cls, WeeklyMenuMixin):
+            yield "parse_week[{}]".format(name), partial(
+                parse_week_page, body, restaurant_cls
+            )
+        menus.append(parse_page(body, restaurant_cls, 0))
+
+    today = datetime(2017, 8, 7)
+    yield "format_menus", lambda: FormattedMenus(menus, today=today).format_menus()
+
+    messages = list(FormattedMenus(menus, today=today))
+    yield "format_msg", lambda: [slack.format_msg(msg) for msg in messages]
+    yield "pack_messages", lambda: slack.pack_messages(messages)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Names of cases slower than the baseline by more than `threshold`
+    """
+    slower = []
+    for name, result in results["cases"].items():
+        expected = baseline["cases"].get(name)
+        if expected and result["median_s"] > expected["median_s"] * (1 + threshold):
+            slower.append(name)
+    return slower
+
+
+def run(repeat: int, only=None) -> dict:
+    results = {
+        "python": platform.python_version(),
+        "created": datetime.now().isoformat(),
+        "repeat": repeat,
+        "cases": {},
+    }
+    for name, func in cases():
+        if only and only not in name:
+            continue
+        results["cases"][name] = measure(func, repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", help="run only cases containing this text")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.only)
+    for name, result in results["cases"].items():
+        print(
+            "{:45} {:9.3f} ms {:10} B peak".format(
+                name, result["median_s"] * 1000, result["peak_bytes"]
+            )
+        )
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        slower = compare(results, json.load(f), args.threshold)
+    for name in slower:
+        print("Slower than baseline: {}".format(name), file=sys.stderr)
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
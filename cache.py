@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime
+
+
+class DailyCache:
+    """
+    Keep one value per day, the value expires at midnight
+
+    Concurrent callers asking for a missing value await the same in-flight
+    computation instead of starting their own.
+    """
+
+    def __init__(self, clock=datetime.today) -> None:
+        self.clock = clock
+        self.period = None
+        self.value = None
+        self.task = None
+        self.task_period = None
+
+    def current_period(self):
+        return self.clock().date()
+
+    def peek(self):
+        """Return today's value or None when it was not computed yet"""
+        if self.period == self.current_period():
+            return self.value
+        return None
+
+    def put(self, value):
+        """Replace today's value"""
+        self.period = self.current_period()
+        self.value = value
+
+    def forget(self):
+        self.period = None
+        self.value = None
+
+    def start(self, compute):
+        """
+        Start computing today's value unless it is known or already in
+        flight, return the in-flight task or None
+        """
+        period = self.current_period()
+        if self.period == period:
+            return None
+
+        if self.task is None or self.task_period != period:
+            self.task = asyncio.ensure_future(compute())
+            self.task_period = period
+            self.task.add_done_callback(lambda task: self._store(task, period))
+        return self.task
+
+    async def get(self, compute):
+        task = self.start(compute)
+        if task is None:
+            return self.value
+
+        # Shield the shared task, a client going away must not cancel
+        # the computation other clients are waiting for.
+        return await asyncio.shield(task)
+
+    def _store(self, task, period):
+        if task is self.task:
+            self.task = None
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.period is None or period >= self.period:
+            self.period = period
+            self.value = task.result()
+
+
+class WeeklyCache(DailyCache):
+    """
+    Keep one value per ISO week
+    """
+
+    def current_period(self):
+        return tuple(self.clock().isocalendar()[:2])
+
+
+class PartialResults:
+    """
+    Items of a running computation, followers get every item as soon as
+    it is added
+    """
+
+    def __init__(self) -> None:
+        self.items = []
+        self.done = False
+        self.condition = asyncio.Condition()
+
+    async def add(self, item):
+        async with self.condition:
+            self.items.append(item)
+            self.condition.notify_all()
+
+    async def finish(self):
+        async with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    async def follow(self):
+        position = 0
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(
+                    lambda: self.done or position < len(self.items)
+                )
+                items = self.items[position:]
+                done = self.done
+            for item in items:
+                yield item
+            position += len(items)
+            if done and position == len(self.items):
+                return
+
+
+class LastGoodMenus:
+    """
+    Remember the last successfully scraped menu of every restaurant
+    """
+
+    def __init__(self, clock=datetime.today) -> None:
+        self.clock = clock
+        self.menus = {}
+
+    def remember(self, name: str, menu):
+        self.menus[name] = (self.clock(), menu)
+
+    def recall(self, name: str):
+        """Return the last good menu marked as stale, or None"""
+        if name not in self.menus:
+            return None
+        scraped, menu = self.menus[name]
+        return menu.as_stale(scraped)
@@ -0,0 +1,81 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stop calling something which keeps failing
+
+    After `threshold` consecutive failures the circuit opens and calls are
+    refused. Once the backoff passes, one probing call is let through
+    (half-open): its success closes the circuit, its failure opens it again
+    for twice as long, up to `max_backoff` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        threshold=3,
+        backoff=60.0,
+        max_backoff=3600.0,
+        clock=time.monotonic,
+    ) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+
+    def allow(self) -> bool:
+        """Whether a call may be made now"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() >= self.retry_at:
+            self.state = HALF_OPEN
+            logger.info("Circuit of %s is half-open, probing", self.name)
+            return True
+        return False
+
+    def success(self):
+        if self.state != CLOSED:
+            logger.warning("Circuit of %s closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            delay = min(self.backoff * 2 ** self.opened, self.max_backoff)
+            self.state = OPEN
+            self.opened += 1
+            self.retry_at = self.clock() + delay
+            logger.warning(
+                "Circuit of %s opened after %d failures, next probe in %d s",
+                self.name,
+                self.failures,
+                delay,
+            )
+
+    def cancel(self):
+        """The call was cancelled, a probe is allowed again right away"""
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+            self.retry_at = self.clock()
+
+    def status(self) -> dict:
+        retry_in = None
+        if self.retry_at is not None:
+            retry_in = max(0, round(self.retry_at - self.clock()))
+        return {"state": self.state, "failures": self.failures, "retry_in": retry_in}
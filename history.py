@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from restaurants import NO_PRICE
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dishes (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    restaurant TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    dish TEXT NOT NULL,
+    price TEXT,
+    UNIQUE (day, restaurant, position)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS dishes_fts USING fts5(
+    restaurant, dish, content='dishes', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS dishes_ai AFTER INSERT ON dishes BEGIN
+    INSERT INTO dishes_fts (rowid, restaurant, dish)
+    VALUES (new.id, new.restaurant, new.dish);
+END;
+CREATE TRIGGER IF NOT EXISTS dishes_ad AFTER DELETE ON dishes BEGIN
+    INSERT INTO dishes_fts (dishes_fts, rowid, restaurant, dish)
+    VALUES ('delete', old.id, old.restaurant, old.dish);
+END;
+"""
+
+
+def match_query(text: str, column: str) -> str:
+    """
+    FTS5 query matching all words of `text` in `column`, words are quoted
+    so user input can not use the query syntax
+    """
+    words = ['"{}"'.format(word.replace('"', '""')) for word in text.split()]
+    return "{} : ({})".format(column, " ".join(words))
+
+
+def format_price(price):
+    return None if price is NO_PRICE else str(price)
+
+
+class MenuHistory:
+    """
+    Menus of every day kept in SQLite with a full-text index of dishes
+
+    Recorded menus are written in batches by a single background thread,
+    recording never waits for the database.
+    """
+
+    def __init__(self, path: str, delay=1.0) -> None:
+        self.path = path
+        self.delay = delay
+        self.pending = []
+        self.flush_task = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.db = None
+
+    def record(self, menus):
+        """Queue today's scraped menus, stale and failed menus are skipped"""
+        day = menus.today.date().isoformat()
+        for menu in menus.menus[1:]:
+            if not menu.failed and not menu.stale_since:
+                self.pending.append((day, menu))
+        if self.pending and self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.delay)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        if batch:
+            loop = asyncio.get_event_loop()
+            try:
+                await loop.run_in_executor(self.executor, self._write, batch)
+            except sqlite3.Error:
+                logger.exception("Could not store menu history")
+
+    async def search(self, text: str, restaurant=None, limit=20) -> List[dict]:
+        """Dishes matching all words of `text`, the latest first"""
+        query = match_query(text, "dish")
+        if restaurant:
+            query += " AND " + match_query(restaurant, "restaurant")
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._search, query, limit)
+
+    async def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.executor, self._close)
+        self.executor.shutdown()
+
+    def _connect(self):
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(self.path)
+            self.db.executescript(SCHEMA)
+        return self.db
+
+    def _write(self, batch):
+        db = self._connect()
+        with db:
+            for day, menu in batch:
+                name = menu.restaurant_name
+                db.execute(
+                    "DELETE FROM dishes WHERE day = ? AND restaurant = ?", (day, name)
+                )
+                db.executemany(
+                    "INSERT INTO dishes (day, restaurant, position, dish, price) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (day, name, position, food, format_price(price))
+                        for position, (food, price) in enumerate(
+                            zip(menu.foods, menu.prices)
+                        )
+                    ],
+                )
+
+    def _search(self, query, limit):
+        rows = self._connect().execute(
+            "SELECT d.day, d.restaurant, d.dish, d.price FROM dishes_fts "
+            "JOIN dishes d ON d.id = dishes_fts.rowid "
+            "WHERE dishes_fts MATCH ? ORDER BY d.day DESC, d.position LIMIT ?",
+            (query, limit),
+        )
+        return [
+            {"date": day, "restaurant": restaurant, "dish": dish, "price": price}
+            for day, restaurant, dish, price in rows
+        ]
+
+    def _close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
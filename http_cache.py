@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from urllib.parse import urlparse
+
+from incremental import ReadUntil, read_until
+from metrics import DOWNLOAD_BYTES, DOWNLOAD_SECONDS, PARSE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Page:
+    """
+    Downloaded body of one URL
+    """
+
+    def __init__(self, url: str, body: str, digest: str, from_cache=False) -> None:
+        self.url = url
+        self.body = body
+        self.digest = digest
+        self.from_cache = from_cache
+
+
+class ResponseCache:
+    """
+    Store page bodies together with their validators, one file per URL
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def path(self, url: str) -> str:
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def load(self, url: str):
+        try:
+            with open(self.path(url), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url: str, entry: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.path(url), os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.path(url))
+
+
+def host_key(url: str) -> str:
+    """
+    Name of the host for concurrency limits, www.example.com and
+    example.com are one site
+    """
+    host = urlparse(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def rebase_url(url: str, base_url: str) -> str:
+    """
+    Address of the page on a stand-in server, base_url/host/path
+    """
+    parts = urlparse(url)
+    rebased = "{}/{}{}".format(base_url.rstrip("/"), parts.netloc, parts.path)
+    return rebased + ("?" + parts.query if parts.query else "")
+
+
+class CachedSession:
+    """
+    Fetch pages with conditional GETs
+
+    Validators of the last response are replayed as If-None-Match and
+    If-Modified-Since, on 304 the body is taken from the on-disk cache.
+    Parsing runs in an executor, its results are kept while the content
+    hash of the page stays the same, so restaurants pointing at one page
+    share them.
+
+    Requests to one host are limited by a semaphore and identical URLs
+    requested at the same time are downloaded only once.
+
+    With `until` the page is read in chunks and the download is dropped
+    as soon as the menu container was read whole. Such pages are cached
+    apart from pages read whole.
+
+    With `base_url` all pages are downloaded from that server instead,
+    e.g. from a local replay server in load tests.
+    """
+
+    def __init__(
+        self,
+        aio_session,
+        cache: ResponseCache,
+        host_limit=2,
+        host_limits=None,
+        executor=None,
+        base_url=None,
+    ) -> None:
+        self.aio_session = aio_session
+        self.cache = cache
+        self.host_limit = host_limit
+        self.host_limits = host_limits or {}
+        self.executor = executor
+        self.base_url = base_url
+        self.semaphores = {}
+        self.in_flight = {}
+        self.parsed = {}
+
+    def semaphore(self, url: str) -> asyncio.Semaphore:
+        host = host_key(url)
+        if host not in self.semaphores:
+            limit = self.host_limits.get(host, self.host_limit)
+            self.semaphores[host] = asyncio.Semaphore(limit)
+        return self.semaphores[host]
+
+    async def fetch(self, url: str, until: ReadUntil = None) -> Page:
+        key = url if until is None else "{} until {}".format(url, until.key)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url, key, until))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+
+    async def _fetch(self, url: str, key: str, until: ReadUntil = None) -> Page:
+        loop = asyncio.get_event_loop()
+        entry = await loop.run_in_executor(None, self.cache.load, key)
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        request_url = rebase_url(url, self.base_url) if self.base_url else url
+        async with self.semaphore(url), self.aio_session.get(
+            request_url, headers=headers
+        ) as resp:
+            if resp.status == 304 and entry:
+                return Page(url, entry["body"], entry["digest"], from_cache=True)
+            site = urlparse(request_url).hostname
+            with DOWNLOAD_SECONDS.time(site=site):
+                if until is None:
+                    body = await resp.text()
+                else:
+                    body = await read_until(resp, until)
+            DOWNLOAD_BYTES.inc(len(body.encode()), site=site)
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+            status = resp.status
+
+        digest = hashlib.sha256(body.encode()).hexdigest()
+        if status == 200 and (etag or last_modified):
+            entry = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "digest": digest,
+                "body": body,
+            }
+            try:
+                await loop.run_in_executor(None, self.cache.store, key, entry)
+            except OSError:
+                logger.warning("Could not cache %s", url, exc_info=True)
+        return Page(url, body, digest)
+
+    async def parse(self, page: Page, parse, *args, restaurant=""):
+        """
+        Return parse(page.body, *args) computed in the executor, reusing
+        the previous result while the content of the page did not change
+
+        Only the parse itself is timed, not the wait for the executor nor
+        reused results.
+        """
+        key = (page.url, parse) + args
+        cached = self.parsed.get(key)
+        if cached and cached[0] == page.digest:
+            return cached[1]
+        loop = asyncio.get_event_loop()
+        result, seconds = await loop.run_in_executor(
+            self.executor, timed, parse, page.body, *args
+        )
+        PARSE_SECONDS.observe(seconds, restaurant=restaurant)
+        self.parsed[key] = (page.digest, result)
+        return result
+
+
+def timed(function, *args):
+    """Result of function(*args) and seconds it took, run in the executor"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
@@ -0,0 +1,92 @@
+import codecs
+from html.parser import HTMLParser
+
+
+class ContainerEnd(HTMLParser):
+    """
+    Push parser noticing when the `count`-th element described by `only`,
+    the arguments of a SoupStrainer, is closed
+    """
+
+    def __init__(self, only: dict, count=1) -> None:
+        super().__init__(convert_charrefs=False)
+        self.name = only.get("name")
+        self.class_ = only.get("class_")
+        self.id = only.get("id")
+        self.count = count
+        self.seen = 0
+        self.tag = None
+        self.depth = 0
+        self.done = False
+
+    def matches(self, tag, attrs) -> bool:
+        attrs = dict(attrs)
+        if self.name and tag != self.name:
+            return False
+        if self.id and attrs.get("id") != self.id:
+            return False
+        if self.class_ and self.class_ not in (attrs.get("class") or "").split():
+            return False
+        return True
+
+    def handle_starttag(self, tag, attrs):
+        if self.tag is not None:
+            if tag == self.tag:
+                self.depth += 1
+        elif not self.done and self.matches(tag, attrs):
+            self.tag = tag
+            self.depth = 1
+
+    def handle_endtag(self, tag):
+        if self.tag is None or tag != self.tag:
+            return
+        self.depth -= 1
+        if self.depth == 0:
+            self.tag = None
+            self.seen += 1
+            self.done = self.seen >= self.count
+
+
+class ReadUntil:
+    """
+    Stop reading a page once the menu container was seen whole, e.g. the
+    container at the top of a page with big footers and scripts
+    """
+
+    def __init__(self, only: dict, count=1) -> None:
+        self.only = only
+        self.count = count
+
+    @property
+    def key(self) -> str:
+        return "{}:{}".format(sorted(self.only.items()), self.count)
+
+    def detector(self) -> ContainerEnd:
+        return ContainerEnd(self.only, self.count)
+
+
+def response_decoder(charset):
+    try:
+        decoder = codecs.getincrementaldecoder(charset or "utf-8")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")
+    return decoder(errors="replace")
+
+
+async def read_until(resp, until: ReadUntil, chunk_size=16384) -> str:
+    """
+    Text of the response read in chunks, up to the chunk in which `until`
+    saw the end of the container, the rest is never downloaded
+    """
+    decoder = response_decoder(resp.charset)
+    detector = until.detector()
+    parts = []
+    async for chunk in resp.content.iter_chunked(chunk_size):
+        text = decoder.decode(chunk)
+        parts.append(text)
+        detector.feed(text)
+        if detector.done:
+            break
+    else:
+        parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
@@ -0,0 +1,175 @@
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Iterable
+
+import aiohttp
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REGISTRY = []
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    labels = ",".join('{}="{}"'.format(name, escape(value)) for name, value in pairs)
+    return "{" + labels + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labels: Iterable = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        yield "# HELP {} {}".format(self.name, self.documentation)
+        yield "# TYPE {} {}".format(self.name, self.kind)
+
+
+class Counter(Metric):
+    """
+    Monotonically growing value
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        yield from super().render()
+        for key, value in sorted(self.values.items()):
+            yield "{}{} {}".format(self.name, format_labels(self.labels, key), value)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        if key not in self.values:
+            self.values[key] = SimpleNamespace(
+                counts=[0] * len(self.buckets), sum=0.0, count=0
+            )
+        series = self.values[key]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series.counts[i] += 1
+        series.sum += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        yield from super().render()
+        for key, series in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, series.counts):
+                labels = format_labels(self.labels, key, [("le", bound)])
+                yield "{}_bucket{} {}".format(self.name, labels, count)
+            labels = format_labels(self.labels, key, [("le", "+Inf")])
+            yield "{}_bucket{} {}".format(self.name, labels, series.count)
+            labels = format_labels(self.labels, key)
+            yield "{}_sum{} {}".format(self.name, labels, series.sum)
+            yield "{}_count{} {}".format(self.name, labels, series.count)
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text format
+    """
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+SCRAPE_SECONDS = Histogram(
+    "lunch_scrape_seconds", "Time to get the menu of a restaurant.", ["restaurant"]
+)
+SCRAPES = Counter(
+    "lunch_scrapes_total", "Menus retrieved by outcome.", ["restaurant", "outcome"]
+)
+PARSE_SECONDS = Histogram(
+    "lunch_parse_seconds", "Time to parse the menu of a restaurant.", ["restaurant"]
+)
+CONNECT_SECONDS = Histogram(
+    "lunch_http_connect_seconds", "Time to open a new connection.", ["site"]
+)
+FIRST_BYTE_SECONDS = Histogram(
+    "lunch_http_first_byte_seconds", "Time to response headers.", ["site"]
+)
+DOWNLOAD_SECONDS = Histogram(
+    "lunch_http_download_seconds", "Time to read a response body.", ["site"]
+)
+DOWNLOAD_BYTES = Counter("lunch_http_download_bytes_total", "Bytes read.", ["site"])
+RESPONSES = Counter(
+    "lunch_http_responses_total", "HTTP responses by status.", ["site", "status"]
+)
+FORMAT_SECONDS = Histogram("lunch_format_seconds", "Time to format all menus.")
+SLACK_POST_SECONDS = Histogram(
+    "lunch_slack_post_seconds", "Time of one post to Slack, retries included."
+)
+SLACK_POSTS = Counter("lunch_slack_posts_total", "Slack posts by status.", ["status"])
+ERROR_REPORTS = Counter(
+    "lunch_error_reports_total", "Errors reported to Sentry by outcome.", ["outcome"]
+)
+
+
+async def on_request_start(session, context, params):
+    context.site = params.url.host
+    context.start = time.perf_counter()
+
+
+async def on_connection_create_start(session, context, params):
+    context.connect_start = time.perf_counter()
+
+
+async def on_connection_create_end(session, context, params):
+    CONNECT_SECONDS.observe(
+        time.perf_counter() - context.connect_start, site=context.site
+    )
+
+
+async def on_request_end(session, context, params):
+    FIRST_BYTE_SECONDS.observe(time.perf_counter() - context.start, site=context.site)
+    RESPONSES.inc(site=context.site, status=params.response.status)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """
+    Record connect and time-to-first-byte of every request of a session
+    """
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_request_end.append(on_request_end)
+    return config
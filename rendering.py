@@ -0,0 +1,26 @@
+import gzip
+import hashlib
+
+
+class RenderedText:
+    """
+    Text encoded once, together with its gzip version, each with its own
+    strong ETag
+    """
+
+    __slots__ = ("body", "gzipped", "etag", "gzip_etag")
+
+    def __init__(self, text: str) -> None:
+        self.body = text.encode()
+        self.gzipped = gzip.compress(self.body)
+        digest = hashlib.sha1(self.body).hexdigest()
+        self.etag = '"{}"'.format(digest)
+        self.gzip_etag = '"{}-gzip"'.format(digest)
+
+    def matches(self, if_none_match: str, etag: str = None) -> bool:
+        """
+        Whether the If-None-Match header names this version, `etag` of the
+        variant being sent, the identity one by default
+        """
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or (etag or self.etag) in tags
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import sys
+import time
+from collections import deque
+
+from metrics import ERROR_REPORTS
+
+logger = logging.getLogger(__name__)
+
+
+class Occurrence:
+    """
+    One failure and how many times it repeated within the window
+    """
+
+    def __init__(self, key: tuple, since: float) -> None:
+        self.key = key
+        self.since = since
+        self.repeated = 0
+
+
+class ErrorReporter:
+    """
+    Send errors to Sentry from a background task
+
+    Reporting only queues the error, so scrapes never wait for Sentry.
+    An error repeating with the same key within `window` seconds is sent
+    once, the number of repeats follows in one summary message. When the
+    queue holds `max_pending` errors, the oldest ones are dropped.
+    """
+
+    def __init__(self, window=300, max_pending=100, clock=time.monotonic) -> None:
+        self.window = window
+        self.clock = clock
+        self.pending = deque(maxlen=max_pending)
+        self.occurrences = {}
+        self.client = None
+        self.wakeup = None
+        self.task = None
+
+    def report(self, name: str, exc_info=None):
+        """Queue the exception being handled, failed at `name`"""
+        exc_info = exc_info or sys.exc_info()
+        key = (name, exc_info[0].__name__, str(exc_info[1]))
+        now = self.clock()
+        occurrence = self.occurrences.get(key)
+        if occurrence and now - occurrence.since < self.window:
+            occurrence.repeated += 1
+            ERROR_REPORTS.inc(outcome="deduplicated")
+            return
+
+        self.forget_expired(now)
+        self.occurrences[key] = Occurrence(key, now)
+        self.queue(("exception", exc_info, name))
+
+    def forget_expired(self, now: float):
+        for key, occurrence in list(self.occurrences.items()):
+            if now - occurrence.since >= self.window:
+                self.summarize(occurrence)
+                del self.occurrences[key]
+
+    def summarize(self, occurrence: Occurrence):
+        if occurrence.repeated:
+            name, error, text = occurrence.key
+            message = "{}: {}({}) repeated {} times".format(
+                name, error, text, occurrence.repeated
+            )
+            self.queue(("message", message, name))
+
+    def queue(self, item):
+        if len(self.pending) == self.pending.maxlen:
+            ERROR_REPORTS.inc(outcome="dropped")
+        self.pending.append(item)
+        if self.wakeup:
+            self.wakeup.set()
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        """Send summaries of all repeated errors and whatever is queued"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for occurrence in self.occurrences.values():
+            self.summarize(occurrence)
+        self.occurrences = {}
+        await self.flush()
+
+    async def run(self):
+        while True:
+            # Woken at least once per window to summarize repeats which
+            # are not followed by any other error.
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            self.forget_expired(self.clock())
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        loop = asyncio.get_event_loop()
+        while self.pending:
+            item = self.pending.popleft()
+            try:
+                await loop.run_in_executor(None, self.send, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                ERROR_REPORTS.inc(outcome="failed")
+                logger.exception("Could not report error to Sentry")
+            else:
+                ERROR_REPORTS.inc(outcome="sent")
+
+    def send(self, item):
+        kind, value, name = item
+        client = self.sentry_client()
+        if kind == "exception":
+            client.captureException(exc_info=value, tags={"restaurant": name})
+        else:
+            client.captureMessage(value, tags={"restaurant": name})
+
+    def sentry_client(self):
+        if self.client is None:
+            # Imported here, raven takes a while to import and most runs never
+            # need it.
+            from raven import Client
+
+            # credentials is taken from environment variable SENTRY_DSN
+            self.client = Client()
+        return self.client
+
+
+REPORTER = ErrorReporter()
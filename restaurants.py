@@ -1,14 +1,31 @@
 import abc
+import asyncio
+import importlib.util
+import json
 import logging
 import os
 import re
+import time
+import unicodedata
 from datetime import datetime
 
-from bs4 import BeautifulSoup
+from cache import WeeklyCache
+from circuit import CircuitBreaker
+from incremental import ReadUntil
+from metrics import FORMAT_SECONDS, SCRAPE_SECONDS, SCRAPES
+from rendering import RenderedText
+from reporting import REPORTER
 
 FB_APP_ID = os.environ.get("FB_APP_ID", None)
 FB_APP_SECRET = os.environ.get("FB_APP_SECRET", None)
-NO_PRICE = object()
+HTML_PARSER = os.environ.get("HTML_PARSER", "html.parser")
+# Restaurants failing this many times in a row are skipped, probed again
+# after the backoff, which doubles up to the max with every failed probe.
+CIRCUIT_FAILURES = int(os.environ.get("CIRCUIT_FAILURES", 3))
+CIRCUIT_BACKOFF = float(os.environ.get("CIRCUIT_BACKOFF", 60))
+CIRCUIT_MAX_BACKOFF = float(os.environ.get("CIRCUIT_MAX_BACKOFF", 3600))
+# Seconds before a weekly page is fetched again for a day not published yet.
+WEEK_REFETCH_INTERVAL = float(os.environ.get("WEEK_REFETCH_INTERVAL", 300))
 TODAY = datetime.today().weekday()
 DAY_NAMES = [
     "pondelok",
@@ -32,18 +49,135 @@ DAY_NAMES2 = [  # vysklonovane nazvy
 logger = logging.getLogger(__name__)
 
 
+class _NoPrice:
+    """
+    Price of a food which has none, keeps its identity when pickled
+    """
+
+    def __reduce__(self):
+        return "NO_PRICE"
+
+    def __repr__(self):
+        return "NO_PRICE"
+
+
+NO_PRICE = _NoPrice()
+
+HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+
+def restaurant_key(name: str) -> str:
+    """
+    Short name of a restaurant for URLs, "TOTO Kantína (5.5€)" is "toto-kantina"
+    """
+    name = unicodedata.normalize("NFKD", name.split(" (")[0])
+    name = name.encode("ascii", "ignore").decode().lower()
+    return "-".join(re.findall(r"[a-z0-9]+", name))
+
+
+def format_time(value):
+    return value and value.isoformat(timespec="seconds")
+
+
+def parse_time(value):
+    return value and datetime.fromisoformat(value)
+
+
 class Menu:
-    def __init__(self, rest_name: str) -> None:
+    """
+    Foods of one restaurant, frozen once finished so it is rendered only once
+
+    Text for Slack and the dict for JSON are both made from a frozen menu
+    once, see as_dict.
+    """
+
+    __slots__ = (
+        "restaurant_name",
+        "url",
+        "foods",
+        "prices",
+        "scraped_at",
+        "stale_since",
+        "failed",
+        "data",
+        "rendered",
+    )
+
+    def __init__(self, rest_name: str, url: str = None) -> None:
         self.restaurant_name = rest_name
+        self.url = url
         self.foods = []
         self.prices = []
+        self.scraped_at = None
+        self.stale_since = None
+        self.failed = False
+        self.data = None
+        self.rendered = None
+
+    def __setattr__(self, name, value):
+        if getattr(self, "rendered", None) is not None:
+            raise AttributeError("Menu of {} is frozen".format(self.restaurant_name))
+        super().__setattr__(name, value)
 
     def add_item(self, food: str, price=NO_PRICE):
+        if self.rendered is not None:
+            raise AttributeError("Menu of {} is frozen".format(self.restaurant_name))
         self.foods.append(food.strip())
         self.prices.append(price)
 
+    def freeze(self) -> "Menu":
+        if self.rendered is None:
+            self.foods = tuple(self.foods)
+            self.prices = tuple(self.prices)
+            self.data = self.as_dict()
+            self.rendered = self.render()
+        return self
+
+    def as_stale(self, since: datetime) -> "Menu":
+        """Copy of the menu marked as scraped earlier at `since`"""
+        menu = Menu(self.restaurant_name, self.url)
+        menu.foods = list(self.foods)
+        menu.prices = list(self.prices)
+        menu.scraped_at = since
+        menu.stale_since = since
+        return menu
+
+    def as_dict(self) -> dict:
+        """Menu as plain data, NO_PRICE is None"""
+        if self.data is not None:
+            return self.data
+        return {
+            "restaurant": self.restaurant_name,
+            "key": restaurant_key(self.restaurant_name),
+            "url": self.url,
+            "foods": list(self.foods),
+            "prices": [None if price is NO_PRICE else price for price in self.prices],
+            "scraped_at": format_time(self.scraped_at),
+            "stale_since": format_time(self.stale_since),
+            "failed": self.failed,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Menu":
+        menu = cls(data["restaurant"], data["url"])
+        for food, price in zip(data["foods"], data["prices"]):
+            menu.add_item(food, NO_PRICE if price is None else price)
+        menu.scraped_at = parse_time(data["scraped_at"])
+        menu.stale_since = parse_time(data["stale_since"])
+        menu.failed = data["failed"]
+        return menu
+
     def __str__(self):
+        if self.rendered is not None:
+            return self.rendered
+        return self.render()
+
+    def render(self):
         items = ["*{}*".format(self.restaurant_name)]
+        if self.stale_since:
+            items[0] += " _(neaktuálne, menu z {})_".format(
+                self.stale_since.strftime("%d.%m. %H:%M")
+            )
         items += [
             "{}{}".format(food, self.format_price(price))
             for food, price in zip(self.foods, self.prices)
@@ -54,11 +188,23 @@ class Menu:
         return " ({}€)".format(price) if price is not NO_PRICE else ""
 
 
+def needs_retry(menu: Menu) -> bool:
+    """Whether the menu failed or is empty, worth scraping again later"""
+    return menu.failed or not menu.foods
+
+
 class FormattedMenus:
+    """
+    Menus of all restaurants formatted for Slack, rendered only once
+    """
+
     def __init__(self, menus: list, today=datetime.today()) -> None:
-        self.menus = menus
+        self.menus = [menu.freeze() for menu in menus]
         self.today = today
         self.formatted = None
+        self.text = None
+        self.rendered_text = None
+        self.rendered_json = None
 
     def __len__(self) -> int:
         return len(self.menus)
@@ -69,13 +215,39 @@ class FormattedMenus:
         return self.formatted[key]
 
     def __str__(self):
-        if not self.formatted:
-            self.format_menus()
-        return "\n\n".join(self.formatted)
+        if self.text is None:
+            if not self.formatted:
+                self.format_menus()
+            self.text = "\n\n".join(self.formatted)
+        return self.text
+
+    def rendered(self) -> RenderedText:
+        """Encoded and compressed text, computed on first use"""
+        if self.rendered_text is None:
+            self.rendered_text = RenderedText(str(self))
+        return self.rendered_text
+
+    def as_dict(self, keys=None) -> dict:
+        """All menus as plain data, or only menus of restaurants in `keys`"""
+        menus = [menu.as_dict() for menu in self.menus]
+        if keys is not None:
+            menus = [menu for menu in menus if menu["key"] in keys]
+        return {"date": self.today.date().isoformat(), "menus": menus}
+
+    def rendered_as_json(self, keys=None) -> RenderedText:
+        """Encoded JSON of as_dict, all menus are encoded only once"""
+        if keys is not None:
+            return RenderedText(json.dumps(self.as_dict(keys), ensure_ascii=False))
+        if self.rendered_json is None:
+            self.rendered_json = RenderedText(
+                json.dumps(self.as_dict(), ensure_ascii=False)
+            )
+        return self.rendered_json
 
     def format_menus(self):
-        self.formatted = [self.add_header(self.menus[0])]
-        self.formatted += sorted(map(str, self.menus[1:]))
+        with FORMAT_SECONDS.time():
+            self.formatted = [self.add_header(self.menus[0])]
+            self.formatted += sorted(map(str, self.menus[1:]))
 
     def add_header(self, menu):
         return "*Obedy v {} {}*\n\n{}".format(
@@ -103,99 +275,419 @@ class Restaurant(abc.ABC):
 class SafeRestaurant(Restaurant):
     """
     Catch all exceptions so the application will not break
+
+    When the restaurant fails or does not finish within `timeout` seconds,
+    its last good menu from `last_good` is served marked as stale. The
+    same is served without trying while its circuit breaker is open.
     """
 
-    def __init__(self, restaurant) -> None:
+    breakers = {}
+
+    def __init__(self, restaurant, timeout=None, last_good=None) -> None:
         super().__init__()
         self.restaurant = restaurant
+        self.timeout = timeout
+        self.last_good = last_good
+
+    def breaker(self) -> CircuitBreaker:
+        name = self.restaurant.name
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(
+                name, CIRCUIT_FAILURES, CIRCUIT_BACKOFF, CIRCUIT_MAX_BACKOFF
+            )
+        return self.breakers[name]
 
     async def retrieve_menu(self, day=TODAY) -> Menu:
+        name = self.restaurant.name
+        breaker = self.breaker()
+        if not breaker.allow():
+            SCRAPES.inc(restaurant=name, outcome="skipped")
+            return self.fallback_menu()
         try:
-            return await self.restaurant.retrieve_menu(day)
+            with SCRAPE_SECONDS.time(restaurant=name):
+                menu = await asyncio.wait_for(
+                    self.restaurant.retrieve_menu(day), self.timeout
+                )
         except NotImplementedError:
-            menu = Menu(self.restaurant.name)
+            SCRAPES.inc(restaurant=name, outcome="not_implemented")
+            menu = Menu(name, self.restaurant.url)
             menu.add_item("Check menu yourself on {}".format(self.restaurant.url))
             return menu
+        except asyncio.CancelledError:
+            SCRAPES.inc(restaurant=name, outcome="cancelled")
+            breaker.cancel()
+            raise
+        except asyncio.TimeoutError:
+            SCRAPES.inc(restaurant=name, outcome="timeout")
+            logger.warning("Timeout scraping %s", name)
+            breaker.failure()
+            return self.fallback_menu()
         except:
-            from main import sentry_client
+            SCRAPES.inc(restaurant=name, outcome="error")
+            REPORTER.report(name)
+            logger.exception("Error scraping %s", name)
+            breaker.failure()
+            return self.fallback_menu()
+
+        SCRAPES.inc(restaurant=name, outcome="ok")
+        breaker.success()
+        if self.last_good is not None and getattr(menu, "foods", None):
+            self.last_good.remember(self.restaurant.name, menu)
+        return menu
 
-            sentry_client.captureException()
-            logger.exception("Error scraping %s", self.restaurant.name)
+    def fallback_menu(self) -> Menu:
+        menu = None
+        if self.last_good is not None:
+            menu = self.last_good.recall(self.restaurant.name)
 
-            menu = Menu(self.restaurant.name)
+        if not menu:
+            menu = Menu(self.restaurant.name, self.restaurant.url)
             menu.add_item(
                 "Problem with scraping. Check menu yourself on {}".format(
                     self.restaurant.url
                 )
             )
-            return menu
+        menu.failed = True
+        return menu
+
+
+class HTMLParser:
+    """
+    Build a document from a page, optionally only from the part of it
+    described by `only`, the arguments of a SoupStrainer
+
+    Falls back to the standard library parser when lxml is not installed.
+    BeautifulSoup is imported on the first parse, not when the app starts.
+    """
+
+    def __init__(self, features=None, only: dict = None) -> None:
+        self.features = features or HTML_PARSER
+        self.only = only
+        self.strainer = None
+
+    def __call__(self, body: str):
+        from bs4 import BeautifulSoup, SoupStrainer
+
+        if self.only and self.strainer is None:
+            self.strainer = SoupStrainer(**self.only)
+        features = self.features
+        if features == "lxml" and not HAS_LXML:
+            features = "html.parser"
+        return BeautifulSoup(body, features, parse_only=self.strainer)
+
+
+def parse_page(body: str, restaurant_cls, day) -> Menu:
+    """
+    Parse menu of a restaurant from the raw page
+
+    Runs in the parse executor, so it gets only picklable arguments and
+    returns a picklable Menu.
+    """
+    restaurant = restaurant_cls(None)
+    restaurant.content = restaurant.parser(body)
+    return stamp(restaurant.parse_menu(day), restaurant)
+
+
+def parse_week_page(body: str, restaurant_cls) -> dict:
+    """
+    Parse menus of all weekdays from the raw page, see parse_page
+    """
+    restaurant = restaurant_cls(None)
+    restaurant.content = restaurant.parser(body)
+    week = restaurant.parse_week()
+    for menu in week.values():
+        stamp(menu, restaurant)
+    return week
+
+
+def stamp(menu: Menu, restaurant) -> Menu:
+    """Mark the menu as scraped now from the page of the restaurant"""
+    menu.url = restaurant.url
+    menu.scraped_at = datetime.now()
+    return menu
 
 
 class StandardRetrieveMenuMixin:
+    parser = HTMLParser()
+    read_until = None
+
     async def retrieve_menu(self, day=TODAY) -> Menu:
-        async with self.aio_session.get(self.url) as resp:
-            self.content = BeautifulSoup(await resp.text(), "html.parser")
-        return self.parse_menu(day)
+        page = await self.aio_session.fetch(self.url, until=self.read_until)
+        return await self.aio_session.parse(
+            page, parse_page, type(self), day, restaurant=self.name
+        )
 
 
-class SMERestaurantMixin:
-    def parse_menu(self, day):
-        menu = Menu(self.name)
-        for item in self.content.find(class_="dnesne_menu").find_all(
-            class_="jedlo_polozka"
-        ):
-            menu.add_item(item.get_text(strip=True))
-        return menu
+class WeeklyMenuMixin:
+    """
+    Page holds menus of the whole week, it is fetched and parsed once and
+    menus of all weekdays are kept until the week changes
 
+    A day missing on a page with menus of other days gets an empty menu.
+    The page is fetched again for it at most once per WEEK_REFETCH_INTERVAL,
+    it may be published later in the week. A page without any menu is
+    broken and raises.
+    """
 
-class DonQuijoteRestaurant(SMERestaurantMixin, StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Don Quijote (5.5€)"
-        self.url = "https://restauracie.sme.sk/restauracia/don-quijote_7436-nove-mesto_2653/denne-menu"
+    weekly_menus = {}
+    refetched_at = {}
 
+    async def retrieve_menu(self, day=TODAY) -> Menu:
+        week = await self.retrieve_week()
+        if not week.get(day) and self.may_refetch():
+            self.week_cache().forget()
+            week = await self.retrieve_week()
+        if not week:
+            self.week_cache().forget()
+            raise ValueError("Can not find menu")
+        if day not in week:
+            return stamp(Menu(self.name), self)
+        return week[day]
+
+    def may_refetch(self) -> bool:
+        now = time.monotonic()
+        last = self.refetched_at.get(self.url)
+        if last is not None and now - last < WEEK_REFETCH_INTERVAL:
+            return False
+        self.refetched_at[self.url] = now
+        return True
+
+    def week_cache(self) -> WeeklyCache:
+        return self.weekly_menus.setdefault(self.url, WeeklyCache())
+
+    async def retrieve_week(self) -> dict:
+        return await self.week_cache().get(self._retrieve_week)
+
+    async def _retrieve_week(self) -> dict:
+        page = await self.aio_session.fetch(self.url, until=self.read_until)
+        return await self.aio_session.parse(
+            page, parse_week_page, type(self), restaurant=self.name
+        )
 
-class KantinaRestaurant(SMERestaurantMixin, StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Kantína (4.8€ / 4€ bez polievky)"
-        self.url = "https://restauracie.sme.sk/restauracia/kantina-vsetko-okolo-jedla_10102-bratislava_2983/denne-menu"
+    def parse_week(self) -> dict:
+        week = {}
+        for day in range(5):
+            try:
+                week[day] = self.parse_menu(day)
+            except (AttributeError, IndexError):
+                pass  # Menu for the day is not published.
+        return week
+
+
+class Selector:
+    """
+    CSS selector compiled by soupsieve once, on first use, and reused by
+    every later scrape
+    """
+
+    def __init__(self, css: str) -> None:
+        self.css = css
+        self.compiled = None
+
+    def select(self, tag) -> list:
+        if self.compiled is None:
+            import soupsieve
+
+            self.compiled = soupsieve.compile(self.css)
+        return self.compiled.select(tag)
+
+    def __repr__(self) -> str:
+        return "Selector ({})".format(self.css)
+
+
+def tag_text(tag) -> str:
+    return tag.text.strip()
+
+
+def stripped_text(tag) -> str:
+    return tag.get_text(strip=True)
+
+
+def drop_empty(items: list) -> list:
+    return [item for item in items if item]
+
+
+def join_dish_rows(items: list) -> list:
+    """
+    Rows of SME pages with dishes split into several rows, one item per dish
+    """
+    dishes = []
+    # Remove useless strings in the beginning and end.
+    for row in items[1:-1]:
+        item = row.capitalize()
+        if item.startswith("€()"):
+            dishes.pop()  # Dish is empty. Remove its heading.
+        elif dishes and "Alergény" not in dishes[-1]:
+            # Concatenate items describing same dish to single line.
+            dishes[-1] = dishes[-1] + " " + item
+        else:
+            dishes.append(item)  # Start of new dish.
+    return dishes
+
+
+class MenuPage:
+    """
+    Declarative description of where the menu is on a restaurant page
+
+    The menu is found in the `container_index`-th match of `container`
+    (the whole page when None). Menus of the whole week are either the
+    day-th match of `days` or, with `day_heading`, the match whose heading
+    starts with the name of the day. Text of every `items` match is taken
+    by `text` and passed through the `cleanup` functions in order.
+
+    With `stop_reading` the download ends once the container described
+    by `only` was read whole, the page must hold no menu below it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        items: str = None,
+        container: str = None,
+        container_index=0,
+        days: str = None,
+        day_heading: str = None,
+        text=tag_text,
+        cleanup=(drop_empty,),
+        features=None,
+        only: dict = None,
+        stop_reading=False,
+    ) -> None:
+        self.name = name
+        self.url = url
+        self.items = items and Selector(items)
+        self.container = container and Selector(container)
+        self.container_index = container_index
+        self.days = days and Selector(days)
+        self.day_heading = day_heading and Selector(day_heading)
+        self.text = text
+        self.cleanup = cleanup
+        self.parser = HTMLParser(features, only)
+        self.read_until = None
+        if stop_reading:
+            self.read_until = ReadUntil(only, count=container_index + 1)
+
+    def find_menu(self, content, day):
+        if self.container:
+            content = self.container.select(content)[self.container_index]
+        if not self.days:
+            return content
+
+        blocks = self.days.select(content)
+        if not self.day_heading:
+            return blocks[day]
+        for block in blocks:
+            headings = self.day_heading.select(block)
+            if headings and tag_text(headings[0]).lower().startswith(DAY_NAMES[day]):
+                return block
+        raise IndexError("Can not find menu")
+
+    def parse(self, content, day) -> list:
+        menu = self.find_menu(content, day)
+        items = [self.text(tag) for tag in self.items.select(menu)]
+        for rule in self.cleanup:
+            items = rule(items)
+        return items
+
+
+def sme_page(name: str, url: str, **kwargs) -> MenuPage:
+    """
+    Daily menu published on restauracie.sme.sk
+    """
+    kwargs.setdefault("text", stripped_text)
+    return MenuPage(
+        name,
+        url,
+        items=".jedlo_polozka",
+        container=".dnesne_menu",
+        only={"class_": "dnesne_menu"},
+        stop_reading=True,
+        **kwargs,
+    )
+
+
+def toto_page(name: str, url: str) -> MenuPage:
+    """
+    Weekly menu of the TOTO restaurants, one block per day
+    """
+    return MenuPage(
+        name,
+        url,
+        items="p",
+        container="div.container",
+        container_index=1,
+        days="div.pb-6",
+        only={"name": "div", "class_": "container"},
+        stop_reading=True,
+    )
+
+
+class PageRestaurant(StandardRetrieveMenuMixin, Restaurant):
+    """
+    Restaurant whose menu is scraped as described by its `page`
+    """
 
+    page = None
 
-class PlzenskaBranaRestaurant(StandardRetrieveMenuMixin, Restaurant):
     def __init__(self, session) -> None:
         super().__init__()
         self.aio_session = session
         self.content = None
-        self.name = "Plzenská brána (5.70)"
-        self.url = "https://menucka.sk/denne-menu/bratislava/plzenska-brana"
+        self.name = self.page.name
+        self.url = self.page.url
+        self.parser = self.page.parser
+        self.read_until = self.page.read_until
 
     def parse_menu(self, day):
         menu = Menu(self.name)
-        container = self.content.find(id="restaurant-actual-menu-id-2024")
-        if not container:
+        for item in self.page.parse(self.content, day):
+            menu.add_item(item)
+        return menu
+
+
+class DonQuijoteRestaurant(PageRestaurant):
+    page = sme_page(
+        "Don Quijote (5.5€)",
+        "https://restauracie.sme.sk/restauracia/don-quijote_7436-nove-mesto_2653/denne-menu",
+    )
+
+
+class KantinaRestaurant(PageRestaurant):
+    page = sme_page(
+        "Kantína (4.8€ / 4€ bez polievky)",
+        "https://restauracie.sme.sk/restauracia/kantina-vsetko-okolo-jedla_10102-bratislava_2983/denne-menu",
+    )
+
+
+class PlzenskaBranaRestaurant(PageRestaurant):
+    page = MenuPage(
+        "Plzenská brána (5.70)",
+        "https://menucka.sk/denne-menu/bratislava/plzenska-brana",
+        items=".col-xs-10",
+        container="#restaurant-actual-menu-id-2024",
+        text=stripped_text,
+        only={"id": "restaurant-actual-menu-id-2024"},
+        stop_reading=True,
+    )
+
+    def parse_menu(self, day):
+        try:
+            return super().parse_menu(day)
+        except IndexError:
+            menu = Menu(self.name)
             menu.add_item(
                 "Problem with scraping. Check menu yourself on {}".format(self.url)
             )
             return menu
-        for item in container.find_all(class_="col-xs-10"):
-            text = item.get_text(strip=True)
-            if text:
-                menu.add_item(text)
-        return menu
 
 
-class DreamsRestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Dream's"
-        self.url = "http://www.dreams-res.sk/menu/daily_menu_sk.php"
+class DreamsRestaurant(PageRestaurant):
+    page = MenuPage(
+        "Dream's",
+        "http://www.dreams-res.sk/menu/daily_menu_sk.php",
+        only={"name": "td"},
+    )
 
     def parse_menu(self, day):
         menu = Menu(self.name)
@@ -214,143 +706,72 @@ class DreamsRestaurant(StandardRetrieveMenuMixin, Restaurant):
         return menu
 
 
-class MenuUJelena(SMERestaurantMixin, StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Menu u Jeleňa"
-        self.url = "https://restauracie.sme.sk/restauracia/menu-u-jelena_9787-nove-mesto_2653/denne-menu"
-
-
-class GastrohouseRestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Gastrohouse a.k.a. vývarovňa Slimák (4.2€)"
-        self.url = "http://gastrohouse.sk/"
-
-    def parse_menu(self, day):
-        menu = Menu(self.name)
-        daily_menu = self.content.select_one("section.denne-menu").find_all("section")
-        today_menu = [
-            section
-            for section in daily_menu
-            if section.find("h2").text.rstrip().lower().startswith(DAY_NAMES[day])
-        ]
-        if not today_menu:
-            raise ValueError("Can not find menu")
-
-        for li in today_menu[0].find_all("li"):
-            # price = float(li.find_all('div')[-1].text.strip()[:-2].replace(',', '.'))
-            menu.add_item(li.find("h3").text.strip())
-
-        return menu
-
-
-class TOTORestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = (
-            "TOTO (6.9€ / 7.5€ extra menu / 9.5€ business menu)"
-        )
-        self.url = "https://www.totorestaurant.sk/toto-restaurant"
-
-    def parse_menu(self, day):
-        menu = Menu(self.name)
-        menu_container = self.content.select("div.container")[1]
-        menu_div = menu_container.select("div.pb-6")[day]
-
-        for p in menu_div.find_all("p"):
-            text = p.text.strip()
-            if text:
-                menu.add_item(text)
-
-        return menu
-
-
-class TOTOCantinaRestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "TOTO Kantína (5.5€ / 4.9€ bez polievky)"
-        self.url = "https://totorestaurant.sk/toto-kantina"
+class MenuUJelena(PageRestaurant):
+    page = sme_page(
+        "Menu u Jeleňa",
+        "https://restauracie.sme.sk/restauracia/menu-u-jelena_9787-nove-mesto_2653/denne-menu",
+    )
 
-    def parse_menu(self, day):
-        menu = Menu(self.name)
-        menu_container = self.content.select("div.container")[1]
-        menu_div = menu_container.select("div.pb-6")[day]
 
-        for p in menu_div.find_all("p"):
-            text = p.text.strip()
-            if text:
-                menu.add_item(text)
+class GastrohouseRestaurant(PageRestaurant):
+    page = MenuPage(
+        "Gastrohouse a.k.a. vývarovňa Slimák (4.2€)",
+        "http://gastrohouse.sk/",
+        items="li > h3",
+        container="section.denne-menu",
+        days="section",
+        day_heading="h2",
+        only={"name": "section", "class_": "denne-menu"},
+        stop_reading=True,
+    )
 
-        return menu
 
+class TOTORestaurant(WeeklyMenuMixin, PageRestaurant):
+    page = toto_page(
+        "TOTO (6.9€ / 7.5€ extra menu / 9.5€ business menu)",
+        "https://www.totorestaurant.sk/toto-restaurant",
+    )
 
-class TOTOPizzaAndGrillRestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "TOTO Pizza & Grill (6.5€ / 7.5€ extra menu)"
-        self.url = "https://totorestaurant.sk/toto-pizza"
 
-    def parse_menu(self, day):
-        menu = Menu(self.name)
-        menu_container = self.content.select("div.container")[1]
-        menu_div = menu_container.select("div.pb-6")[day]
+class TOTOCantinaRestaurant(WeeklyMenuMixin, PageRestaurant):
+    page = toto_page(
+        "TOTO Kantína (5.5€ / 4.9€ bez polievky)",
+        "https://totorestaurant.sk/toto-kantina",
+    )
 
-        for p in menu_div.find_all("p"):
-            text = p.text.strip()
-            if text:
-                menu.add_item(text)
 
-        return menu
+class TOTOPizzaAndGrillRestaurant(WeeklyMenuMixin, PageRestaurant):
+    page = toto_page(
+        "TOTO Pizza & Grill (6.5€ / 7.5€ extra menu)",
+        "https://totorestaurant.sk/toto-pizza",
+    )
 
 
-class AvalonRestaurant(SMERestaurantMixin, StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Avalon"
-        self.url = "https://avalonrestaurant.sk/denne-menu/"
+class AvalonRestaurant(WeeklyMenuMixin, PageRestaurant):
+    page = MenuPage(
+        "Avalon",
+        "https://avalonrestaurant.sk/denne-menu/",
+        items="p",
+        days="section.article__content",
+        only={"name": "section", "class_": "article__content"},
+    )
 
-    def parse_menu(self, day):
-        menu = Menu(self.name)
-        today_menu = self.content.select("section.article__content")[day]
-        for p in today_menu.find_all("p"):
-            text = p.text.strip()
-            if text:
-                menu.add_item(text)
 
-        return menu
-
-
-class OlivaRestaurant(SMERestaurantMixin, StandardRetrieveMenuMixin, Restaurant):
+class OlivaRestaurant(PageRestaurant):
     # Upstream URL: https://www.hotel-premium.sk/sk/dobre-obedy/
+    page = sme_page(
+        "Oliva",
+        "https://restauracie.sme.sk/restauracia/oliva-restaurant-premium-business-hotel_2717-ruzinov_2980/denne-menu",
+    )
 
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Oliva"
-        self.url = "https://restauracie.sme.sk/restauracia/oliva-restaurant-premium-business-hotel_2717-ruzinov_2980/denne-menu"
 
-
-class MonastikRestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "Monastik (5.2€)"
-        self.url = "https://www.monastik.sk/denne-menu/"
+class MonastikRestaurant(WeeklyMenuMixin, PageRestaurant):
+    # Needs the whole page, walks up from the day heading.
+    page = MenuPage(
+        "Monastik (5.2€)",
+        "https://www.monastik.sk/denne-menu/",
+        features="lxml",
+    )
 
     def parse_menu(self, day):
         day_span = self.content.find("span", string=re.compile(fr'\s*{DAY_NAMES[day].upper()}\s*'))
@@ -363,35 +784,12 @@ class MonastikRestaurant(StandardRetrieveMenuMixin, Restaurant):
         return menu
 
 
-class CityCantinaRosumRestaurant(StandardRetrieveMenuMixin, Restaurant):
-    def __init__(self, session) -> None:
-        super().__init__()
-        self.aio_session = session
-        self.content = None
-        self.name = "City Cantina Rosum"
-        self.url = "https://restauracie.sme.sk/restauracia/city-cantina-rosum_8439-ruzinov_2980/denne-menu"
-
-    def parse_menu(self, day):
-        # Remove useless strings in the beginning and end.
-        rows = self.content.find(class_="dnesne_menu").find_all(class_="jedlo_polozka")[
-            1:-1
-        ]
-        items = []
-        for row in rows:
-            item = row.get_text(strip=True).capitalize()
-            if item.startswith("€()"):
-                items.pop()  # Dish is empty. Remove its heading.
-            elif items and "Alergény" not in items[-1]:
-                # Concatenate items describing same dish to single line.
-                items[-1] = items[-1] + " " + item
-            else:
-                items.append(item)  # Start of new dish.
-
-        menu = Menu(self.name)
-        for item in items:
-            menu.add_item(item)
-
-        return menu
+class CityCantinaRosumRestaurant(PageRestaurant):
+    page = sme_page(
+        "City Cantina Rosum",
+        "https://restauracie.sme.sk/restauracia/city-cantina-rosum_8439-ruzinov_2980/denne-menu",
+        cleanup=(join_dish_rows,),
+    )
 
 
 class OtherRestaurant(Restaurant):
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from restaurants import needs_retry
+
+logger = logging.getLogger(__name__)
+
+
+def parse_times(value: str) -> List:
+    """
+    Parse "09:15,09:40" into sorted times of day
+    """
+    return sorted(
+        datetime.strptime(item.strip(), "%H:%M").time()
+        for item in value.split(",")
+        if item.strip()
+    )
+
+
+class PrefetchScheduler:
+    """
+    Run `job` on every work day at the given times of day, in the time
+    zone of `clock`
+    """
+
+    def __init__(self, times: List, job, is_work_day, clock=datetime.now) -> None:
+        self.times = times
+        self.job = job
+        self.is_work_day = is_work_day
+        self.clock = clock
+        self.task = None
+        self.last_run = None
+        self.last_success = None
+        self.last_error = None
+
+    def next_run(self, now: datetime) -> datetime:
+        """Next run after `now`, in the time zone of `now`"""
+        for at in self.times:
+            candidate = datetime.combine(now.date(), at, tzinfo=now.tzinfo)
+            if candidate > now:
+                return candidate
+        tomorrow = now.date() + timedelta(days=1)
+        return datetime.combine(tomorrow, self.times[0], tzinfo=now.tzinfo)
+
+    def start(self):
+        if self.times:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self):
+        while True:
+            now = self.clock()
+            await asyncio.sleep((self.next_run(now) - now).total_seconds())
+            if self.is_work_day():
+                await self.run_job()
+
+    async def run_job(self):
+        self.last_run = self.clock()
+        try:
+            await self.job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            logger.exception("Prefetch failed")
+            self.last_error = repr(ex)
+        else:
+            self.last_success = self.last_run
+            self.last_error = None
+
+    def status(self) -> dict:
+        return {
+            "times": [at.strftime("%H:%M") for at in self.times],
+            "last_run": self.last_run and self.last_run.isoformat(),
+            "last_success": self.last_success and self.last_success.isoformat(),
+            "last_error": self.last_error,
+        }
+
+
+class ScrapeScheduler:
+    """
+    Scrape restaurants of all offices with at most `limit` running at once
+
+    A restaurant listed by several offices is scraped once a day and its
+    menu is shared, failed or empty menus are scraped again when asked
+    next time.
+    Waiting restaurants start by priority, the slowest first (restaurants
+    never timed count as slowest), ties go to those listed by more offices.
+    With `shared` SharedMenus, menus are also shared with other workers.
+    """
+
+    def __init__(
+        self, limit=8, popularity=None, clock=datetime.today, shared=None
+    ) -> None:
+        self.limit = limit
+        self.popularity = popularity or {}
+        self.clock = clock
+        self.shared = shared
+        self.semaphore = None
+        self.tasks = {}
+        self.durations = {}
+        self.running = 0
+
+    def priority(self, name: str) -> tuple:
+        return (
+            -self.durations.get(name, float("inf")),
+            -self.popularity.get(name, 0),
+        )
+
+    def order(self, restaurants: List) -> List:
+        return sorted(restaurants, key=lambda r: self.priority(r.restaurant.name))
+
+    async def retrieve_menu(self, restaurant, day):
+        """
+        Menu of a SafeRestaurant, shared with other callers asking for the
+        same restaurant and day, cancelling the caller does not cancel it
+        """
+        today = self.clock().date()
+        key = (restaurant.restaurant.name, day, today)
+        task = self.tasks.get(key)
+        if task is None:
+            self.forget_before(today)
+            task = asyncio.ensure_future(self._retrieve_menu(restaurant, day, key))
+            self.tasks[key] = task
+        return await asyncio.shield(task)
+
+    def forget(self):
+        """Scrape every restaurant again when asked next time"""
+        self.tasks = {}
+
+    def forget_before(self, today):
+        for key in [key for key in self.tasks if key[2] != today]:
+            del self.tasks[key]
+
+    async def _retrieve_menu(self, restaurant, day, key):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.limit)
+        try:
+            # The shared lock is taken within the slot, so its holder
+            # scrapes right away and never waits for a slot.
+            async with self.semaphore:
+                if self.shared:
+                    menu = await self.shared.retrieve_menu(
+                        restaurant.restaurant.name,
+                        day,
+                        key[2],
+                        lambda: self.scrape(restaurant, day),
+                    )
+                else:
+                    menu = await self.scrape(restaurant, day)
+        except BaseException:
+            self.tasks.pop(key, None)
+            raise
+        if needs_retry(menu):
+            self.tasks.pop(key, None)
+        return menu
+
+    async def scrape(self, restaurant, day):
+        name = restaurant.restaurant.name
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            return await restaurant.retrieve_menu(day)
+        finally:
+            self.running -= 1
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        if name in self.durations:
+            seconds = 0.7 * self.durations[name] + 0.3 * seconds
+        self.durations[name] = seconds
+
+    def status(self) -> dict:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "seconds": {name: round(s, 3) for name, s in self.durations.items()},
+        }
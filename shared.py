@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from restaurants import Menu, needs_retry
+
+logger = logging.getLogger(__name__)
+
+# Shared menus are kept a day, the day is a part of their key anyway.
+MENU_TTL = 24 * 60 * 60
+
+
+class SQLiteBackend:
+    """
+    Keys with values and expiry in a SQLite file, shared by all workers
+    of one machine
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.ready = False
+
+    def connect(self):
+        if not self.ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=5)
+        if not self.ready:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self.ready = True
+        return db
+
+    def get(self, key: str):
+        db = self.connect()
+        try:
+            row = db.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            ).fetchone()
+        finally:
+            db.close()
+        return row and row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        db = self.connect()
+        try:
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    (key, value, time.time() + ttl),
+                )
+        finally:
+            db.close()
+
+    def acquire(self, key: str, token: str, ttl: float) -> bool:
+        """Set the key unless it is set, whether it was set by this call"""
+        now = time.time()
+        db = self.connect()
+        try:
+            with db:
+                db.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO entries VALUES (?, ?, ?)",
+                    (key, token, now + ttl),
+                )
+                return cursor.rowcount == 1
+        finally:
+            db.close()
+
+    def release(self, key: str, token: str):
+        db = self.connect()
+        try:
+            with db:
+                db.execute(
+                    "DELETE FROM entries WHERE key = ? AND value = ?", (key, token)
+                )
+        finally:
+            db.close()
+
+
+class RedisBackend:
+    """
+    Keys kept in Redis, shared by workers of all machines
+
+    `client` is a redis.Redis or anything with its get, set and delete.
+    """
+
+    def __init__(self, client) -> None:
+        self.client = client
+
+    def get(self, key: str):
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: float):
+        self.client.set(key, value, ex=int(ttl))
+
+    def acquire(self, key: str, token: str, ttl: float) -> bool:
+        return bool(self.client.set(key, token, nx=True, ex=int(ttl)))
+
+    def release(self, key: str, token: str):
+        # The lock expires anyway if it is taken over in between.
+        if self.get(key) == token:
+            self.client.delete(key)
+
+
+def create_backend(url: str):
+    """
+    Backend for "sqlite:path" or "redis://...", None for an empty url
+    """
+    if not url:
+        return None
+    if url.startswith("sqlite:"):
+        return SQLiteBackend(url[len("sqlite:") :])
+    if url.startswith(("redis://", "rediss://")):
+        import redis
+
+        return RedisBackend(redis.Redis.from_url(url))
+    raise ValueError("Unknown shared cache {}".format(url))
+
+
+class SharedMenus:
+    """
+    Menus scraped by any worker, shared with the others through `backend`
+
+    The first worker asking for a menu of a restaurant takes its lock and
+    scrapes it, the others wait for its result for up to `wait` seconds,
+    by default as long as the lock may be held. Failed or empty menus are
+    not shared. When the backend fails, menus are scraped locally.
+    """
+
+    def __init__(self, backend, lock_ttl=30.0, wait=None, poll=0.2) -> None:
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.wait = lock_ttl if wait is None else wait
+        self.poll = poll
+
+    async def retrieve_menu(self, name: str, day, date, scrape) -> Menu:
+        """Shared menu of the restaurant, `scrape` it when nobody did yet"""
+        key = "menu:{}:{}:{}".format(date.isoformat(), day, name)
+        menu = await self.load(key)
+        if menu:
+            return menu
+
+        loop = asyncio.get_event_loop()
+        token = uuid.uuid4().hex
+        end = loop.time() + self.wait
+        while loop.time() < end:
+            # Without a working backend every worker scrapes for itself.
+            locked = await self.call(
+                self.backend.acquire, "lock:" + key, token, self.lock_ttl, default=True
+            )
+            if locked:
+                try:
+                    # The previous holder may have stored it since.
+                    menu = await self.load(key)
+                    if menu:
+                        return menu
+                    menu = await scrape()
+                    if not needs_retry(menu):
+                        await self.call(
+                            self.backend.set,
+                            key,
+                            json.dumps(menu.as_dict()),
+                            MENU_TTL,
+                        )
+                    return menu
+                finally:
+                    await self.call(self.backend.release, "lock:" + key, token)
+
+            await asyncio.sleep(self.poll)
+            menu = await self.load(key)
+            if menu:
+                return menu
+
+        logger.warning("Gave up waiting for %s scraped by another worker", name)
+        return await scrape()
+
+    async def load(self, key: str):
+        value = await self.call(self.backend.get, key)
+        if not value:
+            return None
+        try:
+            return Menu.from_dict(json.loads(value))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring broken shared menu %s", key, exc_info=True)
+            return None
+
+    async def call(self, method, *args, default=None):
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(None, method, *args)
+        except Exception:
+            logger.warning("Shared menu cache failed", exc_info=True)
+            return default
@@ -1,30 +1,371 @@
-from typing import Iterable
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime
+from typing import Iterable, List
 
+from metrics import SLACK_POST_SECONDS, SLACK_POSTS
 
-def format_msg(msg):
+# Limits of Slack Block Kit messages.
+MAX_BLOCKS = 50
+MAX_TEXT = 3000
+MAX_MESSAGE_TEXT = 40000
+
+logger = logging.getLogger(__name__)
+
+
+def format_msg(msg) -> List[dict]:
+    """
+    Blocks showing one message, long texts are split between blocks
+    """
     if msg.startswith("https://"):
-        return {
-            "blocks": [
-                {
-                    "type": "image",
-                    "image_url": msg,
-                    "alt_text": "Restaurant menu.",
-                }
-            ]
-        }
-    else:
-        return {"text": msg}
+        return [
+            {
+                "type": "image",
+                "image_url": msg,
+                "alt_text": "Restaurant menu.",
+            }
+        ]
+    return [
+        {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+        for text in split_text(msg)
+    ]
+
+
+def split_text(msg, limit=MAX_TEXT) -> List[str]:
+    parts = []
+    current = ""
+    for line in msg.split("\n"):
+        while len(line) > limit:
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = current + "\n" + line if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def block_size(block) -> int:
+    return len(block["text"]["text"]) if "text" in block else 0
+
+
+def pack_messages(messages: Iterable) -> List[dict]:
+    """
+    Pack messages into as few payloads as Slack limits allow
+    """
+    payloads = []
+    blocks = []
+    size = 0
+    for msg in messages:
+        for block in format_msg(msg):
+            full = len(blocks) == MAX_BLOCKS
+            if blocks and (full or size + block_size(block) > MAX_MESSAGE_TEXT):
+                payloads.append({"blocks": blocks})
+                blocks = []
+                size = 0
+            blocks.append(block)
+            size += block_size(block)
+    if blocks:
+        payloads.append({"blocks": blocks})
+    return payloads
+
+
+def is_transient(status) -> bool:
+    """Whether a post failed with this status can succeed later"""
+    return status is None or status == 429 or status >= 500
+
+
+class Delivery:
+    """
+    Result of posting one payload
+    """
+
+    def __init__(self, payload: dict) -> None:
+        self.payload = payload
+        self.status = None
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+    def __repr__(self) -> str:
+        return "Delivery (status={}, attempts={})".format(self.status, self.attempts)
 
 
 class Channel:
     """
     Represents one channel on a Slack team
+
+    Messages are packed into Block Kit payloads. Throttled (429) and
+    failed (5xx) posts are retried, honouring Retry-After.
     """
 
-    def __init__(self, hook: str, aio_session) -> None:
+    def __init__(self, hook: str, aio_session, max_retries=3, backoff=1.0) -> None:
         self.hook = hook
         self.aio_session = aio_session
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def send(self, messages: Iterable) -> List[Delivery]:
+        deliveries = []
+        for payload in pack_messages(messages):
+            deliveries.append(await self.post(payload))
+        return deliveries
+
+    async def post(self, payload: dict) -> Delivery:
+        with SLACK_POST_SECONDS.time():
+            delivery = await self._post(payload)
+        SLACK_POSTS.inc(status=delivery.status)
+        return delivery
+
+    async def _post(self, payload: dict) -> Delivery:
+        delivery = Delivery(payload)
+        while True:
+            delivery.attempts += 1
+            retry_after = None
+            try:
+                async with self.aio_session.post(self.hook, json=payload) as resp:
+                    delivery.status = resp.status
+                    if resp.status == 200:
+                        delivery.error = None
+                        return delivery
+                    retry_after = resp.headers.get("Retry-After")
+                    delivery.error = await resp.text()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                delivery.status = None
+                delivery.error = repr(ex)
+
+            if not self.should_retry(delivery):
+                break
+            await asyncio.sleep(self.retry_delay(delivery.attempts, retry_after))
+
+        logger.error("Slack delivery failed %s: %s", delivery, delivery.error)
+        return delivery
+
+    def should_retry(self, delivery: Delivery) -> bool:
+        if delivery.attempts > self.max_retries:
+            return False
+        return is_transient(delivery.status)
+
+    def retry_delay(self, attempt, retry_after=None) -> float:
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.backoff * 2 ** (attempt - 1)
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def created_on(path: str) -> date:
+    """Day the payload was saved, its name is the time in nanoseconds"""
+    name = os.path.basename(path).split(".")[0]
+    return datetime.fromtimestamp(int(name) / 1e9).date()
+
+
+def remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DeliveryQueue:
+    """
+    Deliver messages to many Slack hooks in the background
+
+    Every payload is saved to `directory` before it is posted and removed
+    once Slack accepted or permanently refused it. Payloads still failing
+    are posted again after `requeue_delay` seconds, payloads left over by
+    a stopped worker are posted again on start, both only on the day they
+    were saved. Before posting, a payload is moved to the sending directory
+    of the process, so processes sharing `directory` never post it twice.
+    Each hook is posted to by at most `concurrency` workers, with one
+    worker its messages keep order.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        aio_session,
+        concurrency=1,
+        max_retries=3,
+        backoff=1.0,
+        requeue_delay=60.0,
+        clock=date.today,
+    ) -> None:
+        self.directory = directory
+        self.aio_session = aio_session
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.requeue_delay = requeue_delay
+        self.clock = clock
+        self.queues = {}
+        self.workers = []
+        self.requeued = []
+        self.last_id = 0
+        # Payloads being posted by this queue, the process id in its name
+        # tells whether they were left over by a stopped worker.
+        self.sending = os.path.join(
+            directory, "sending", "{}.{}".format(os.getpid(), uuid.uuid4().hex)
+        )
+
+    def start(self):
+        """Queue payloads not delivered before the last stop"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.release_orphans()
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            if created_on(path) != self.clock():
+                logger.warning("Dropping Slack delivery %s of an earlier day", path)
+                remove(path)
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    job = json.load(f)
+            except FileNotFoundError:
+                # Claimed by another worker in the meantime.
+                continue
+            except (OSError, ValueError):
+                logger.warning("Dropping broken Slack delivery %s", path)
+                remove(path)
+                continue
+            self.last_id = max(self.last_id, int(name.split(".")[0]))
+            self.queue(job["hook"]).put_nowait((path, job["payload"]))
+
+    def release_orphans(self):
+        """Put back payloads claimed by workers which are not running anymore"""
+        sending = os.path.join(self.directory, "sending")
+        if not os.path.isdir(sending):
+            return
+        for name in os.listdir(sending):
+            if not is_running(int(name.split(".")[0])):
+                self.release(os.path.join(sending, name))
+
+    def release(self, directory: str):
+        """Put claimed payloads back to be posted by whoever starts next"""
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            try:
+                os.rename(
+                    os.path.join(directory, name), os.path.join(self.directory, name)
+                )
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    def claim(self, path: str):
+        """
+        Move the payload to this worker's sending directory, None when
+        another worker claimed it first
+        """
+        os.makedirs(self.sending, exist_ok=True)
+        claimed = os.path.join(self.sending, os.path.basename(path))
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    async def stop(self):
+        for handle in self.requeued:
+            handle.cancel()
+        self.requeued = []
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.queues = {}
+        self.release(self.sending)
+
+    async def enqueue(self, hooks: Iterable, messages: Iterable):
+        """Save the messages for every hook and return without posting"""
+        payloads = pack_messages(messages)
+        jobs = [(hook, payload) for hook in hooks for payload in payloads]
+        paths = [self.next_path() for _ in jobs]
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.save, paths, jobs)
+        for path, (hook, payload) in zip(paths, jobs):
+            self.queue(hook).put_nowait((path, payload))
+
+    async def join(self):
+        """Wait until all queued payloads were handled"""
+        for queue in list(self.queues.values()):
+            await queue.join()
+
+    def next_path(self) -> str:
+        self.last_id = max(self.last_id + 1, time.time_ns())
+        return os.path.join(self.directory, "{:020d}.json".format(self.last_id))
+
+    def save(self, paths, jobs):
+        os.makedirs(self.directory, exist_ok=True)
+        for path, (hook, payload) in zip(paths, jobs):
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"hook": hook, "payload": payload}, f)
+            os.replace(path + ".tmp", path)
+
+    def queue(self, hook: str) -> asyncio.Queue:
+        if hook not in self.queues:
+            self.queues[hook] = asyncio.Queue()
+            channel = Channel(hook, self.aio_session, self.max_retries, self.backoff)
+            for _ in range(self.concurrency):
+                self.workers.append(
+                    asyncio.ensure_future(self.work(channel, self.queues[hook]))
+                )
+        return self.queues[hook]
+
+    def requeue(self, queue: asyncio.Queue, path: str, payload: dict):
+        loop = asyncio.get_event_loop()
+        self.requeued = [h for h in self.requeued if h.when() > loop.time()]
+        self.requeued.append(
+            loop.call_later(self.requeue_delay, queue.put_nowait, (path, payload))
+        )
 
-    async def send(self, messages: Iterable):
-        for msg in messages:
-            await self.aio_session.post(self.hook, json=format_msg(msg))
+    async def work(self, channel: Channel, queue: asyncio.Queue):
+        while True:
+            path, payload = await queue.get()
+            try:
+                claimed = self.claim(path)
+                if claimed is None:
+                    continue
+                delivery = await channel.post(payload)
+                if delivery.ok or not is_transient(delivery.status):
+                    remove(claimed)
+                elif created_on(path) != self.clock():
+                    logger.error("Dropping Slack delivery %s of an earlier day", path)
+                    remove(claimed)
+                else:
+                    logger.error("Slack delivery %s is posted again later", path)
+                    os.rename(claimed, path)
+                    self.requeue(queue, path, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Slack delivery %s failed", path)
+            finally:
+                queue.task_done()
@@ -0,0 +1,43 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+from restaurants import FormattedMenus, Menu
+
+logger = logging.getLogger(__name__)
+
+
+def save_snapshot(path: str, menus: FormattedMenus):
+    """
+    Write today's menus to `path`, readers never see a half written file
+    """
+    data = {
+        "today": menus.today.isoformat(),
+        "menus": [menu.as_dict() for menu in menus.menus],
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str, today: datetime):
+    """
+    Menus saved by save_snapshot, None when missing, broken or not from `today`
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        saved = datetime.fromisoformat(data["today"])
+        if saved.date() != today.date():
+            return None
+        return FormattedMenus(
+            [Menu.from_dict(menu) for menu in data["menus"]], today=saved
+        )
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Ignoring broken menu snapshot %s", path, exc_info=True)
+        return None
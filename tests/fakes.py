@@ -0,0 +1,86 @@
+import asyncio
+
+from restaurants import Menu
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_menu(name, *foods):
+    menu = Menu(name)
+    for food in foods:
+        menu.add_item(food)
+    return menu
+
+
+class FakeResponse:
+    def __init__(self, status, body="", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def text(self):
+        await asyncio.sleep(0.01)
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeContent:
+    def __init__(self, body, chunk_size):
+        self.body = body.encode()
+        self.chunk_size = chunk_size
+        self.read = 0
+
+    async def iter_chunked(self, n):
+        while self.read < len(self.body):
+            chunk = self.body[self.read : self.read + self.chunk_size]
+            self.read += len(chunk)
+            yield chunk
+
+
+class ChunkedResponse(FakeResponse):
+    charset = "utf-8"
+
+    def __init__(self, status, body="", headers=None, chunk_size=16):
+        super().__init__(status, body, headers)
+        self.content = FakeContent(body, chunk_size)
+
+
+class FakeSafeRestaurant:
+    """
+    Stands for a SafeRestaurant, its menu comes from `scrape` when given
+    """
+
+    active = 0
+    max_active = 0
+
+    def __init__(self, name, started=None, failed=False, scrape=None):
+        self.restaurant = self
+        self.name = name
+        self.started = [] if started is None else started
+        self.failed = failed
+        self.scrape = scrape
+
+    async def retrieve_menu(self, day):
+        self.started.append(self.name)
+        if self.scrape:
+            return await self.scrape()
+        FakeSafeRestaurant.active += 1
+        FakeSafeRestaurant.max_active = max(
+            FakeSafeRestaurant.max_active, FakeSafeRestaurant.active
+        )
+        await asyncio.sleep(0.01)
+        FakeSafeRestaurant.active -= 1
+        menu = Menu(self.name)
+        menu.failed = self.failed
+        return menu
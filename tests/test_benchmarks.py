@@ -0,0 +1,50 @@
+import pytest
+
+import restaurants
+from benchmarks.run import FIXTURES, compare, load_fixture
+from incremental import read_until
+from restaurants import parse_page
+from tests.fakes import ChunkedResponse
+
+
+def test_every_scraper_has_fixture():
+    scrapers = {
+        cls
+        for cls in vars(restaurants).values()
+        if isinstance(cls, type)
+        and issubclass(cls, restaurants.Restaurant)
+        and getattr(cls, "page", None) is not None
+    }
+    assert scrapers == set(FIXTURES)
+
+
+@pytest.mark.parametrize("restaurant_cls", sorted(FIXTURES, key=lambda c: c.__name__))
+def test_fixture_parses_to_menu(restaurant_cls):
+    menu = parse_page(load_fixture(restaurant_cls), restaurant_cls, 0)
+    assert menu.foods
+
+
+def test_compare_reports_slower_cases():
+    baseline = {"cases": {"fast": {"median_s": 1.0}, "slow": {"median_s": 1.0}}}
+    results = {"cases": {"fast": {"median_s": 1.1}, "slow": {"median_s": 1.5}}}
+
+    assert compare(results, baseline, threshold=0.25) == ["slow"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "restaurant_cls",
+    sorted(
+        (cls for cls in FIXTURES if cls(None).read_until),
+        key=lambda c: c.__name__,
+    ),
+)
+async def test_page_read_until_container_parses_the_same(restaurant_cls):
+    body = load_fixture(restaurant_cls)
+    until = restaurant_cls(None).read_until
+    partial = await read_until(ChunkedResponse(200, body, chunk_size=1024), until)
+
+    assert len(partial) < len(body)
+    assert parse_page(partial, restaurant_cls, 0).foods == parse_page(
+        body, restaurant_cls, 0
+    ).foods
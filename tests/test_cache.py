@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from cache import DailyCache, PartialResults
+from tests.fakes import FakeClock
+
+
+class TestDailyCache:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_computation(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "menus"
+
+        cache = DailyCache()
+        results = await asyncio.gather(*[cache.get(compute) for _ in range(5)])
+
+        assert results == ["menus"] * 5
+        assert len(calls) == 1
+        assert await cache.get(compute) == "menus"
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_value_expires_next_day(self):
+        clock = FakeClock(datetime(2017, 8, 10, 23, 59))
+        cache = DailyCache(clock=clock)
+
+        async def compute():
+            return clock.now.day
+
+        assert await cache.get(compute) == 10
+        clock.now = datetime(2017, 8, 11, 0, 1)
+        assert cache.peek() is None
+        assert await cache.get(compute) == 11
+
+    @pytest.mark.asyncio
+    async def test_failure_is_not_cached(self):
+        async def broken():
+            raise ValueError()
+
+        async def compute():
+            return "menus"
+
+        cache = DailyCache()
+        with pytest.raises(ValueError):
+            await cache.get(broken)
+        assert await cache.get(compute) == "menus"
+
+
+class TestPartialResults:
+    @pytest.mark.asyncio
+    async def test_follower_gets_items_as_they_come(self):
+        progress = PartialResults()
+        await progress.add("header")
+
+        async def produce():
+            for item in ["a", "b"]:
+                await asyncio.sleep(0.01)
+                await progress.add(item)
+            await progress.finish()
+
+        async def follow():
+            return [item async for item in progress.follow()]
+
+        followed, _ = await asyncio.gather(follow(), produce())
+
+        assert followed == ["header", "a", "b"]
+        assert [item async for item in progress.follow()] == ["header", "a", "b"]
@@ -0,0 +1,56 @@
+from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from tests.fakes import FakeClock
+
+
+class TestCircuitBreaker:
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            "Avalon", threshold=2, backoff=10, clock=self.clock
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        assert self.breaker.allow()
+
+        self.breaker.failure()
+        assert self.breaker.state == OPEN
+        assert not self.breaker.allow()
+        assert self.breaker.status() == {"state": OPEN, "failures": 2, "retry_in": 10}
+
+    def test_probes_once_after_backoff(self):
+        self.breaker.failure()
+        self.breaker.failure()
+
+        self.clock.now = 10
+        assert self.breaker.allow()
+        assert self.breaker.state == HALF_OPEN
+        assert not self.breaker.allow()
+
+        self.breaker.success()
+        assert self.breaker.state == CLOSED
+        assert self.breaker.allow()
+
+    def test_failed_probe_doubles_backoff(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now = 10
+        self.breaker.allow()
+        self.breaker.failure()
+
+        assert self.breaker.state == OPEN
+        self.clock.now = 29
+        assert not self.breaker.allow()
+        self.clock.now = 30
+        assert self.breaker.allow()
+
+    def test_cancelled_probe_is_retried(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now = 10
+        self.breaker.allow()
+        self.breaker.cancel()
+
+        assert self.breaker.allow()
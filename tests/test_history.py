@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+
+from history import MenuHistory
+from restaurants import FormattedMenus, Menu
+from tests.fakes import make_menu
+
+
+def make_menus(today, *menus):
+    header = Menu("Iné")
+    header.add_item("Mango")
+    return FormattedMenus([header] + list(menus), today=today)
+
+
+class TestMenuHistory:
+    @pytest.fixture(autouse=True)
+    def create_history(self, tmp_path):
+        self.history = MenuHistory(str(tmp_path / "history.sqlite3"), delay=0)
+        yield
+        self.history.executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_finds_latest_day_of_dish(self):
+        self.history.record(
+            make_menus(
+                datetime(2017, 8, 9), make_menu("Avalon", "Sviečková na smotane")
+            )
+        )
+        self.history.record(
+            make_menus(
+                datetime(2017, 8, 10),
+                make_menu("Avalon", "Guláš"),
+                make_menu("TOTO", "Sviečková, knedľa"),
+            )
+        )
+        await self.history.flush()
+
+        dishes = await self.history.search("svieckova")
+        assert [(dish["date"], dish["restaurant"]) for dish in dishes] == [
+            ("2017-08-10", "TOTO"),
+            ("2017-08-09", "Avalon"),
+        ]
+        dishes = await self.history.search("sviečková", restaurant="avalon")
+        assert dishes == [
+            {
+                "date": "2017-08-09",
+                "restaurant": "Avalon",
+                "dish": "Sviečková na smotane",
+                "price": None,
+            }
+        ]
+
+    @pytest.mark.asyncio
+    async def test_scrape_of_same_day_replaces_menu(self):
+        today = datetime(2017, 8, 10)
+        self.history.record(make_menus(today, make_menu("Avalon", "Guláš")))
+        await self.history.flush()
+        self.history.record(make_menus(today, make_menu("Avalon", "Rizoto")))
+        await self.history.flush()
+
+        assert await self.history.search("guláš") == []
+        assert len(await self.history.search("rizoto")) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_menus_and_query_syntax_are_ignored(self):
+        failed = make_menu("Avalon", "Problem with scraping")
+        failed.failed = True
+        self.history.record(make_menus(datetime(2017, 8, 10), failed))
+        await self.history.flush()
+
+        assert await self.history.search('problem OR "') == []
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from http_cache import CachedSession, ResponseCache, host_key, rebase_url
+from incremental import ReadUntil
+from metrics import PARSE_SECONDS
+from tests.fakes import ChunkedResponse, FakeResponse
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+class CountingResponse(FakeResponse):
+    active = 0
+    max_active = 0
+
+    async def __aenter__(self):
+        CountingResponse.active += 1
+        CountingResponse.max_active = max(
+            CountingResponse.max_active, CountingResponse.active
+        )
+        return self
+
+    async def __aexit__(self, *args):
+        CountingResponse.active -= 1
+
+
+class ReadOnlyCache(ResponseCache):
+    def store(self, url, entry):
+        raise PermissionError()
+
+
+class TestCachedSession:
+    @pytest.mark.asyncio
+    async def test_page_is_returned_when_cache_can_not_be_written(self, tmp_path):
+        http = FakeSession(FakeResponse(200, "<p>menu</p>", {"ETag": '"v1"'}))
+        session = CachedSession(http, ReadOnlyCache(str(tmp_path)))
+
+        page = await session.fetch("http://url")
+
+        assert page.body == "<p>menu</p>"
+
+    @pytest.mark.asyncio
+    async def test_not_modified_reuses_cached_body(self, tmp_path):
+        http = FakeSession(
+            FakeResponse(200, "<p>menu</p>", {"ETag": '"v1"'}),
+            FakeResponse(304),
+        )
+        session = CachedSession(http, ResponseCache(str(tmp_path)))
+
+        first = await session.fetch("http://url")
+        second = await session.fetch("http://url")
+
+        assert http.requests[1] == ("http://url", {"If-None-Match": '"v1"'})
+        assert second.body == "<p>menu</p>"
+        assert second.from_cache
+        assert second.digest == first.digest
+
+    @pytest.mark.asyncio
+    async def test_cache_survives_new_session(self, tmp_path):
+        headers = {"Last-Modified": "Thu, 10 Aug 2017 08:00:00 GMT"}
+        http = FakeSession(FakeResponse(200, "<p>menu</p>", headers))
+        await CachedSession(http, ResponseCache(str(tmp_path))).fetch("http://url")
+
+        http = FakeSession(FakeResponse(304))
+        page = await CachedSession(http, ResponseCache(str(tmp_path))).fetch(
+            "http://url"
+        )
+
+        assert http.requests[0][1] == {"If-Modified-Since": headers["Last-Modified"]}
+        assert page.body == "<p>menu</p>"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_content_is_not_parsed_again(self, tmp_path):
+        http = FakeSession(FakeResponse(200, "same"), FakeResponse(200, "same"))
+        session = CachedSession(http, ResponseCache(str(tmp_path)))
+        parsed = []
+
+        for _ in range(2):
+            page = await session.fetch("http://url")
+            await session.parse(page, parsed.append, restaurant="Same")
+
+        assert parsed == ["same"]
+        key = PARSE_SECONDS.key({"restaurant": "Same"})
+        assert PARSE_SECONDS.values[key].count == 1
+
+    @pytest.mark.asyncio
+    async def test_identical_urls_are_fetched_once(self, tmp_path):
+        http = FakeSession(FakeResponse(200, "menu"))
+        session = CachedSession(http, ResponseCache(str(tmp_path)))
+
+        pages = await asyncio.gather(*[session.fetch("http://url") for _ in range(3)])
+
+        assert len(http.requests) == 1
+        assert [page.body for page in pages] == ["menu"] * 3
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_limited_per_host(self, tmp_path):
+        http = FakeSession(*[CountingResponse(200, "menu") for _ in range(5)])
+        session = CachedSession(
+            http, ResponseCache(str(tmp_path)), host_limits={"example.com": 2}
+        )
+
+        await asyncio.gather(
+            *[session.fetch("https://www.example.com/{}".format(i)) for i in range(5)]
+        )
+
+        assert len(http.requests) == 5
+        assert CountingResponse.max_active == 2
+
+
+def test_host_key_ignores_www():
+    assert host_key("https://www.totorestaurant.sk/toto") == "totorestaurant.sk"
+    assert host_key("https://totorestaurant.sk/toto-kantina") == "totorestaurant.sk"
+
+
+def test_rebase_url_keeps_host_and_path():
+    assert (
+        rebase_url("https://www.monastik.sk/denne-menu/?a=1", "http://localhost:8080/")
+        == "http://localhost:8080/www.monastik.sk/denne-menu/?a=1"
+    )
+
+
+MENU_PAGE = (
+    '<div class="menu"><div>Polievka</div><div>Rezeň</div></div>'
+    + "<footer>{}</footer>".format("x" * 1000)
+)
+
+
+class TestReadUntil:
+    @pytest.mark.asyncio
+    async def test_download_stops_after_container(self, tmp_path):
+        resp = ChunkedResponse(200, MENU_PAGE)
+        session = CachedSession(FakeSession(resp), ResponseCache(str(tmp_path)))
+
+        page = await session.fetch("http://url", until=ReadUntil({"class_": "menu"}))
+
+        assert page.body.startswith('<div class="menu"><div>Polievka</div><div>Rezeň')
+        assert "</footer>" not in page.body
+        assert resp.content.read < 100
+
+    @pytest.mark.asyncio
+    async def test_whole_page_is_read_without_container(self, tmp_path):
+        resp = ChunkedResponse(200, MENU_PAGE)
+        session = CachedSession(FakeSession(resp), ResponseCache(str(tmp_path)))
+
+        page = await session.fetch("http://url", until=ReadUntil({"id": "other"}))
+
+        assert page.body == MENU_PAGE
+
+    @pytest.mark.asyncio
+    async def test_partial_page_is_cached_apart(self, tmp_path):
+        http = FakeSession(
+            ChunkedResponse(200, MENU_PAGE, {"ETag": '"v1"'}),
+            FakeResponse(200, MENU_PAGE),
+        )
+        session = CachedSession(http, ResponseCache(str(tmp_path)))
+
+        await session.fetch("http://url", until=ReadUntil({"class_": "menu"}))
+        page = await session.fetch("http://url")
+
+        assert http.requests[1] == ("http://url", {})
+        assert page.body == MENU_PAGE
@@ -0,0 +1,214 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import main
+from cache import DailyCache, LastGoodMenus
+from history import MenuHistory
+from main import format_event, gather_menus, prefetch_menus
+from restaurants import (
+    CIRCUIT_FAILURES,
+    FormattedMenus,
+    Menu,
+    Restaurant,
+    SafeRestaurant,
+)
+from scheduler import ScrapeScheduler
+from snapshot import save_snapshot
+from tests.fakes import make_menu
+
+
+class FakeRestaurant(Restaurant):
+    def __init__(self, name, delay=0) -> None:
+        super().__init__()
+        self.name = name
+        self.url = "http://{}".format(name)
+        self.delay = delay
+
+    async def retrieve_menu(self, day=0) -> Menu:
+        await asyncio.sleep(self.delay)
+        menu = Menu(self.name)
+        menu.add_item("Food")
+        return menu
+
+
+class TestGatherMenus:
+    @pytest.mark.asyncio
+    async def test_slow_restaurant_gets_fallback_after_deadline(self):
+        restaurants = [
+            SafeRestaurant(FakeRestaurant("slow", delay=10)),
+            SafeRestaurant(FakeRestaurant("fast")),
+        ]
+
+        menus = await gather_menus(restaurants, 0, deadline=0.05)
+
+        assert [menu.restaurant_name for menu in menus] == ["fast", "slow"]
+        assert menus[1].foods == [
+            "Problem with scraping. Check menu yourself on http://slow"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_slow_restaurant_gets_last_good_menu(self):
+        last_good = LastGoodMenus()
+        restaurant = FakeRestaurant("slow")
+        await SafeRestaurant(restaurant, last_good=last_good).retrieve_menu()
+
+        restaurant.delay = 10
+        safe = SafeRestaurant(restaurant, timeout=0.05, last_good=last_good)
+        menus = await gather_menus([safe], 0, deadline=1)
+
+        assert menus[0].foods == ["Food"]
+        assert menus[0].stale_since is not None
+        assert "neaktuálne" in str(menus[0])
+
+
+class BrokenRestaurant(FakeRestaurant):
+    async def retrieve_menu(self, day=0) -> Menu:
+        self.calls = getattr(self, "calls", 0) + 1
+        raise ValueError("Redesigned")
+
+
+class TestCircuitBreaker:
+    def setup_method(self):
+        SafeRestaurant.breakers.clear()
+
+    def teardown_method(self):
+        SafeRestaurant.breakers.clear()
+
+    @pytest.mark.asyncio
+    async def test_broken_restaurant_is_skipped(self):
+        restaurant = BrokenRestaurant("broken")
+        menus = [
+            await SafeRestaurant(restaurant).retrieve_menu()
+            for _ in range(CIRCUIT_FAILURES + 2)
+        ]
+
+        assert restaurant.calls == CIRCUIT_FAILURES
+        assert all(menu.failed for menu in menus)
+        assert SafeRestaurant.breakers["broken"].status()["state"] == "open"
+
+
+def test_format_event_sends_every_line_as_data():
+    assert format_event("*A*\n1. Food") == "event: menu\ndata: *A*\ndata: 1. Food\n\n"
+
+
+class TestPrefetchMenus:
+    @pytest.mark.asyncio
+    async def test_retries_only_failed_restaurants(self, monkeypatch, tmp_path):
+        failed = make_menu("B", "Problem with scraping")
+        failed.failed = True
+        menus = [make_menu("Iné", "Mango"), make_menu("A", "Food"), failed]
+        app = {
+            "menu_caches": {main.DEFAULT_OFFICE: DailyCache()},
+            "cached_session": None,
+            "last_good_menus": None,
+            "scrape_scheduler": None,
+            "menu_history": MenuHistory(str(tmp_path / "history.sqlite3")),
+        }
+        cache = app["menu_caches"][main.DEFAULT_OFFICE]
+        cache.put(FormattedMenus(menus, today=datetime.today()))
+        retried = []
+
+        async def fake_retrieve_menus(session, day, last_good=None, names=None, **kw):
+            retried.append(names)
+            return [make_menu("Iné", "Mango"), make_menu("B", "Fixed food")]
+
+        monkeypatch.setattr(main, "retrieve_menus", fake_retrieve_menus)
+        monkeypatch.setattr(main, "SNAPSHOT_PATH", str(tmp_path / "menus.json"))
+        await prefetch_menus(app)
+
+        cached = cache.peek()
+        assert retried == [{"B"}]
+        assert [list(menu.foods) for menu in cached.menus] == [
+            ["Mango"],
+            ["Food"],
+            ["Fixed food"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_retries_empty_menu_through_scheduler(self, monkeypatch, tmp_path):
+        restaurant = EmptyFirstRestaurant("A")
+        app = {
+            "menu_caches": {main.DEFAULT_OFFICE: DailyCache()},
+            "scrape_progress": {},
+            "cached_session": None,
+            "last_good_menus": None,
+            "scrape_scheduler": ScrapeScheduler(),
+            "menu_history": MenuHistory(str(tmp_path / "history.sqlite3")),
+        }
+        monkeypatch.setattr(main, "create_restaurants", lambda *args: [restaurant])
+        monkeypatch.setattr(main, "SNAPSHOT_PATH", str(tmp_path / "menus.json"))
+        await prefetch_menus(app)
+
+        cached = app["menu_caches"][main.DEFAULT_OFFICE].peek()
+        assert restaurant.calls == 2
+        assert list(cached.menus[1].foods) == ["Food"]
+
+
+class TestCachedMenus:
+    @pytest.mark.asyncio
+    async def test_failed_menus_are_repaired_in_background(self, monkeypatch, tmp_path):
+        failed = make_menu("B", "Problem with scraping")
+        failed.failed = True
+        app = {
+            "menu_caches": {main.DEFAULT_OFFICE: DailyCache()},
+            "repairs": {},
+            "cached_session": None,
+            "last_good_menus": None,
+            "scrape_scheduler": None,
+            "menu_history": MenuHistory(str(tmp_path / "history.sqlite3")),
+        }
+        cache = app["menu_caches"][main.DEFAULT_OFFICE]
+        cache.put(FormattedMenus([make_menu("Iné", "Mango"), failed]))
+        retried = []
+
+        async def fake_retrieve_menus(session, day, last_good=None, names=None, **kw):
+            retried.append(names)
+            return [make_menu("Iné", "Mango"), make_menu("B", "Fixed food")]
+
+        monkeypatch.setattr(main, "retrieve_menus", fake_retrieve_menus)
+        monkeypatch.setattr(main, "SNAPSHOT_PATH", str(tmp_path / "menus.json"))
+        menus = await main.cached_menus(app)
+        await app["repairs"][main.DEFAULT_OFFICE][1]
+
+        assert menus.menus[1].failed
+        assert list(cache.peek().menus[1].foods) == ["Fixed food"]
+        assert retried == [{"B"}]
+
+        cache.put(FormattedMenus([make_menu("Iné", "Mango"), failed]))
+        await main.cached_menus(app)
+        assert retried == [{"B"}]
+
+
+class EmptyFirstRestaurant(FakeRestaurant):
+    """Publishes its menu only after the first scrape"""
+
+    calls = 0
+
+    async def retrieve_menu(self, day=0) -> Menu:
+        self.calls += 1
+        if self.calls == 1:
+            return Menu(self.name)
+        return await super().retrieve_menu(day)
+
+
+class TestRestoreSnapshot:
+    @pytest.mark.asyncio
+    async def test_restored_menus_are_served_and_refreshed(self, monkeypatch, tmp_path):
+        path = str(tmp_path / "menus.json")
+        save_snapshot(path, FormattedMenus([make_menu("Iné", "Old")]))
+        cache = DailyCache()
+        app = {"menu_caches": {main.DEFAULT_OFFICE: cache}}
+
+        async def fake_scrape():
+            return FormattedMenus([make_menu("Iné", "New")])
+
+        monkeypatch.setattr(main, "SNAPSHOT_PATH", path)
+        monkeypatch.setattr(main, "is_work_day", lambda: True)
+        monkeypatch.setattr(main, "scrape_menus", lambda app: fake_scrape())
+        await main.restore_snapshot(app)
+
+        assert list(cache.peek().menus[0].foods) == ["Old"]
+        await app["refresh_task"]
+        assert list(cache.peek().menus[0].foods) == ["New"]
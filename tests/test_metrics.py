@@ -0,0 +1,40 @@
+from metrics import Counter, Histogram, REGISTRY
+
+
+class TestHistogram:
+    def setup_method(self):
+        self.histogram = Histogram(
+            "test_seconds", "Test.", ["restaurant"], buckets=(0.1, 1)
+        )
+        REGISTRY.remove(self.histogram)
+
+    def test_renders_cumulative_buckets(self):
+        self.histogram.observe(0.05, restaurant="A")
+        self.histogram.observe(0.5, restaurant="A")
+
+        assert list(self.histogram.render()) == [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{restaurant="A",le="0.1"} 1',
+            'test_seconds_bucket{restaurant="A",le="1"} 2',
+            'test_seconds_bucket{restaurant="A",le="+Inf"} 2',
+            'test_seconds_sum{restaurant="A"} 0.55',
+            'test_seconds_count{restaurant="A"} 2',
+        ]
+
+    def test_time_observes_duration(self):
+        with self.histogram.time(restaurant="B"):
+            pass
+
+        assert self.histogram.values[("B",)].count == 1
+
+
+def test_counter_escapes_labels():
+    counter = Counter("test_total", "Test.", ["restaurant"])
+    REGISTRY.remove(counter)
+    counter.inc(restaurant='Dream\'s "best"')
+    counter.inc(2, restaurant='Dream\'s "best"')
+
+    assert (
+        list(counter.render())[-1] == 'test_total{restaurant="Dream\'s \\"best\\""} 3'
+    )
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from reporting import ErrorReporter
+from tests.fakes import FakeClock
+
+
+class FakeSentryClient:
+    def __init__(self):
+        self.exceptions = []
+        self.messages = []
+
+    def captureException(self, exc_info=None, tags=None):
+        self.exceptions.append((str(exc_info[1]), tags["restaurant"]))
+
+    def captureMessage(self, message, tags=None):
+        self.messages.append(message)
+
+
+def fail(reporter, name, text="Can not find menu"):
+    try:
+        raise ValueError(text)
+    except ValueError:
+        reporter.report(name)
+
+
+class TestErrorReporter:
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.reporter = ErrorReporter(window=60, clock=self.clock)
+        self.reporter.client = FakeSentryClient()
+
+    @pytest.mark.asyncio
+    async def test_report_does_not_wait_for_sentry(self):
+        fail(self.reporter, "Avalon")
+
+        assert self.reporter.client.exceptions == []
+        await self.reporter.flush()
+        assert self.reporter.client.exceptions == [("Can not find menu", "Avalon")]
+
+    @pytest.mark.asyncio
+    async def test_repeated_errors_are_sent_once_and_summarized(self):
+        for _ in range(3):
+            fail(self.reporter, "Avalon")
+        fail(self.reporter, "TOTO")
+        await self.reporter.flush()
+
+        assert len(self.reporter.client.exceptions) == 2
+
+        self.clock.now = 61
+        fail(self.reporter, "Avalon")
+        await self.reporter.flush()
+
+        assert len(self.reporter.client.exceptions) == 3
+        assert self.reporter.client.messages == [
+            "Avalon: ValueError(Can not find menu) repeated 2 times"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_stop_sends_pending_summaries(self):
+        self.reporter.start()
+        fail(self.reporter, "Avalon")
+        fail(self.reporter, "Avalon")
+        await self.reporter.stop()
+
+        assert len(self.reporter.client.exceptions) == 1
+        assert len(self.reporter.client.messages) == 1
+
+    @pytest.mark.asyncio
+    async def test_summary_is_sent_when_window_ends(self):
+        reporter = ErrorReporter(window=0.05)
+        reporter.client = FakeSentryClient()
+        reporter.start()
+        fail(reporter, "Avalon")
+        fail(reporter, "Avalon")
+        await asyncio.sleep(0.2)
+
+        assert reporter.client.messages == [
+            "Avalon: ValueError(Can not find menu) repeated 1 times"
+        ]
+        await reporter.stop()
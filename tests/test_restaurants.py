@@ -1,16 +1,30 @@
+import asyncio
+import gzip
+import json
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from unittest.mock import Mock, call
 
 import pytest
 
 from restaurants import (
+    CIRCUIT_FAILURES,
     DonQuijoteRestaurant,
     FormattedMenus,
+    HTMLParser,
     KantinaRestaurant,
+    NO_PRICE,
     Menu,
+    MenuPage,
     SafeRestaurant,
+    TOTORestaurant,
+    WeeklyMenuMixin,
+    parse_page,
+    restaurant_key,
 )
-from slack import Channel
+from slack import Channel, DeliveryQueue
 
 
 class AsyncMock(Mock):
@@ -40,19 +54,184 @@ class TestDonQuijoteRestaurant:
         ]
 
 
+class FakeSlackResponse:
+    def __init__(self, status=200, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.released = False
+
+    async def text(self):
+        return "error"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.released = True
+
+
+class FakeSlackSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, url, json=None):
+        self.calls.append(call(url, json=json))
+        return self.responses.pop(0) if self.responses else FakeSlackResponse()
+
+
 class TestChannel:
     @pytest.mark.asyncio
     async def test_send_provided_messages(self):
-        http = AsyncMock()
+        http = FakeSlackSession()
         url = "http://url"
         ch = Channel(url, http)
-        await ch.send(["first message", "second message"])
-
-        assert http.post.call_count == 2
-        assert http.post.call_args_list == [
-            call(url, json={"text": "first message"}),
-            call(url, json={"text": "second message"}),
+        deliveries = await ch.send(["first message", "second message"])
+
+        assert http.calls == [
+            call(
+                url,
+                json={
+                    "blocks": [
+                        {
+                            "type": "section",
+                            "text": {"type": "mrkdwn", "text": "first message"},
+                        },
+                        {
+                            "type": "section",
+                            "text": {"type": "mrkdwn", "text": "second message"},
+                        },
+                    ]
+                },
+            ),
         ]
+        assert [delivery.ok for delivery in deliveries] == [True]
+
+    @pytest.mark.asyncio
+    async def test_payloads_respect_block_limit(self):
+        http = FakeSlackSession()
+        ch = Channel("http://url", http)
+        await ch.send(["message {}".format(i) for i in range(60)])
+
+        assert [len(c.kwargs["json"]["blocks"]) for c in http.calls] == [50, 10]
+
+    @pytest.mark.asyncio
+    async def test_retries_after_rate_limit(self):
+        throttled = FakeSlackResponse(429, {"Retry-After": "0"})
+        http = FakeSlackSession(throttled, FakeSlackResponse(200))
+        ch = Channel("http://url", http)
+        deliveries = await ch.send(["message"])
+
+        assert deliveries[0].ok
+        assert deliveries[0].attempts == 2
+        assert throttled.released
+
+    @pytest.mark.asyncio
+    async def test_reports_failed_delivery(self):
+        http = FakeSlackSession(FakeSlackResponse(404))
+        ch = Channel("http://url", http)
+        deliveries = await ch.send(["message"])
+
+        assert not deliveries[0].ok
+        assert deliveries[0].status == 404
+        assert len(http.calls) == 1
+
+
+class TestDeliveryQueue:
+    @pytest.mark.asyncio
+    async def test_posts_to_every_hook_in_background(self, tmp_path):
+        http = FakeSlackSession()
+        queue = DeliveryQueue(str(tmp_path), http)
+        queue.start()
+
+        await queue.enqueue(["http://a", "http://b"], ["message"])
+        assert len(list(tmp_path.glob("*.json"))) == 2
+        await queue.join()
+        await queue.stop()
+
+        assert sorted(c.args[0] for c in http.calls) == ["http://a", "http://b"]
+        assert list(tmp_path.glob("*.json")) == []
+
+    @pytest.mark.asyncio
+    async def test_unsent_messages_survive_restart(self, tmp_path):
+        failing = FakeSlackSession(FakeSlackResponse(500))
+        queue = DeliveryQueue(str(tmp_path), failing, max_retries=0)
+        queue.start()
+        await queue.enqueue(["http://a"], ["message"])
+        await queue.join()
+        await queue.stop()
+
+        http = FakeSlackSession()
+        queue = DeliveryQueue(str(tmp_path), http)
+        queue.start()
+        await queue.join()
+        await queue.stop()
+
+        assert len(failing.calls) == 1
+        assert len(http.calls) == 1
+        assert list(tmp_path.glob("*.json")) == []
+
+    @pytest.mark.asyncio
+    async def test_workers_sharing_directory_post_once(self, tmp_path):
+        http = FakeSlackSession()
+        first = DeliveryQueue(str(tmp_path), http)
+        second = DeliveryQueue(str(tmp_path), http)
+        first.start()
+
+        await first.enqueue(["http://a"], ["message"])
+        second.start()
+        await first.join()
+        await second.join()
+        await first.stop()
+        await second.stop()
+
+        assert len(http.calls) == 1
+        assert list(tmp_path.glob("**/*.json")) == []
+
+    @pytest.mark.asyncio
+    async def test_messages_of_stopped_worker_are_posted(self, tmp_path):
+        orphaned = tmp_path / "sending" / "99999999.old"
+        orphaned.mkdir(parents=True)
+        job = {"hook": "http://a", "payload": {"text": "message"}}
+        name = "{:020d}.json".format(time.time_ns())
+        (orphaned / name).write_text(json.dumps(job))
+        http = FakeSlackSession()
+
+        queue = DeliveryQueue(str(tmp_path), http)
+        queue.start()
+        await queue.join()
+        await queue.stop()
+
+        assert len(http.calls) == 1
+        assert list(tmp_path.glob("**/*.json")) == []
+
+    @pytest.mark.asyncio
+    async def test_messages_of_earlier_day_are_dropped(self, tmp_path):
+        job = {"hook": "http://a", "payload": {"text": "message"}}
+        (tmp_path / "00000000000000000001.json").write_text(json.dumps(job))
+        http = FakeSlackSession()
+
+        queue = DeliveryQueue(str(tmp_path), http)
+        queue.start()
+        await queue.join()
+        await queue.stop()
+
+        assert http.calls == []
+        assert list(tmp_path.glob("*.json")) == []
+
+    @pytest.mark.asyncio
+    async def test_failing_message_is_posted_again_later(self, tmp_path):
+        http = FakeSlackSession(FakeSlackResponse(500))
+        queue = DeliveryQueue(str(tmp_path), http, max_retries=0, requeue_delay=0.01)
+        queue.start()
+        await queue.enqueue(["http://a"], ["message"])
+        await queue.join()
+        await asyncio.sleep(0.05)
+        await queue.join()
+        await queue.stop()
+
+        assert len(http.calls) == 2
+        assert list(tmp_path.glob("**/*.json")) == []
 
 
 class TestMenu:
@@ -63,6 +242,17 @@ class TestMenu:
 
         assert str(m) == MENU_1
 
+    def test_frozen_menu_can_not_change(self):
+        m = Menu("Restaurant A")
+        m.add_item("Food 1")
+        m.freeze()
+
+        with pytest.raises(AttributeError):
+            m.add_item("Food 2")
+        with pytest.raises(AttributeError):
+            m.failed = True
+        assert m.foods == ("Food 1",)
+
 
 class TestFormattedMenus:
     def test_will_format_messages(self):
@@ -80,6 +270,62 @@ class TestFormattedMenus:
         assert str(formatted_menus) == FORMATTED_MENU_2
 
 
+class TestMenuData:
+    def test_restaurant_key_is_short_ascii_name(self):
+        assert restaurant_key("TOTO Kantína (5.5€ / 4.9€ bez polievky)") == (
+            "toto-kantina"
+        )
+
+    def test_menus_as_json(self):
+        menu = Menu("Avalon", "https://avalonrestaurant.sk/denne-menu/")
+        menu.add_item("Polievka")
+        menu.add_item("Rezeň", 6.9)
+        menus = FormattedMenus(
+            [Menu("Iné"), menu, Menu("TOTO")], today=datetime(2017, 8, 10)
+        )
+
+        data = json.loads(menus.rendered_as_json().body)
+
+        assert data["date"] == "2017-08-10"
+        assert data["menus"][1] == {
+            "restaurant": "Avalon",
+            "key": "avalon",
+            "url": "https://avalonrestaurant.sk/denne-menu/",
+            "foods": ["Polievka", "Rezeň"],
+            "prices": [None, 6.9],
+            "scraped_at": None,
+            "stale_since": None,
+            "failed": False,
+        }
+        assert menus.rendered_as_json() is menus.rendered_as_json()
+        filtered = json.loads(menus.rendered_as_json({"avalon", "toto"}).body)
+        assert [menu["key"] for menu in filtered["menus"]] == ["avalon", "toto"]
+
+    def test_parsed_menu_knows_its_source(self):
+        menu = parse_page(SME_PAGE, DonQuijoteRestaurant, 0)
+
+        assert menu.url == DonQuijoteRestaurant(None).url
+        assert menu.scraped_at is not None
+
+
+class TestRenderedText:
+    def test_formatted_menus_are_rendered_once(self):
+        formatted_menus = FormattedMenus([Menu("Restaurant A")], today=datetime.today())
+        rendered = formatted_menus.rendered()
+
+        assert formatted_menus.rendered() is rendered
+        assert gzip.decompress(rendered.gzipped) == rendered.body
+        assert rendered.matches('"other", {}'.format(rendered.etag))
+        assert not rendered.matches('"other"')
+
+    def test_gzip_version_has_its_own_etag(self):
+        rendered = FormattedMenus([Menu("Restaurant A")]).rendered()
+
+        assert rendered.gzip_etag != rendered.etag
+        assert rendered.matches(rendered.gzip_etag, rendered.gzip_etag)
+        assert not rendered.matches(rendered.etag, rendered.gzip_etag)
+
+
 class TestSafeRestaurant:
     def setup(self):
         self.nested_restaurant = DonQuijoteRestaurant(AsyncMock())
@@ -118,6 +364,135 @@ class TestKantina:
         ]
 
 
+class TestHTMLParser:
+    def test_restricted_parse_keeps_only_menu_container(self):
+        restaurant = DonQuijoteRestaurant(session=None)
+        restaurant.content = restaurant.parser(SME_PAGE)
+
+        assert restaurant.content.find("footer") is None
+        assert restaurant.parse_menu(0).foods == ["Polievka", "Rezeň"]
+
+    def test_falls_back_to_standard_parser(self, monkeypatch):
+        monkeypatch.setattr("restaurants.HAS_LXML", False)
+        content = HTMLParser("lxml")(SME_PAGE)
+
+        assert content.find(class_="jedlo_polozka").text == "Polievka"
+
+
+class TestParsePage:
+    def test_menu_survives_pickling(self):
+        menu = Menu("Restaurant A")
+        menu.add_item("Food 1")
+
+        assert pickle.loads(pickle.dumps(menu)).prices == [NO_PRICE]
+
+    def test_parses_in_process_pool(self):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            menu = executor.submit(
+                parse_page, SME_PAGE, DonQuijoteRestaurant, 0
+            ).result()
+
+        assert menu.foods == ["Polievka", "Rezeň"]
+        assert str(menu) == "*Don Quijote (5.5€)*\nPolievka\nRezeň"
+
+
+GASTRO_PAGE = """
+<section class="denne-menu">
+  <section><h2>Pondelok 9.8.</h2><ul><li><h3>Guláš</h3></li></ul></section>
+  <section><h2>Utorok 10.8.</h2><ul><li><h3>Rizoto</h3></li><li><h3>Pizza</h3></li></ul></section>
+</section>
+"""
+
+
+class TestMenuPage:
+    def test_finds_day_by_heading(self):
+        page = MenuPage(
+            "Gastro", "http://gastro", items="li h3", days="section", day_heading="h2"
+        )
+        content = page.parser(GASTRO_PAGE)
+
+        assert page.parse(content, 1) == ["Rizoto", "Pizza"]
+        with pytest.raises(IndexError):
+            page.parse(content, 2)
+
+    def test_selectors_are_compiled_once(self):
+        page = MenuPage("Toto", "http://toto", items="p", container="div.container")
+        page.parse(page.parser(TOTO_PAGE), 0)
+        compiled = page.items.compiled
+        page.parse(page.parser(TOTO_PAGE), 0)
+
+        assert compiled is not None
+        assert page.items.compiled is compiled
+
+
+class FakePageSession:
+    def __init__(self, body):
+        self.body = body
+        self.fetched = 0
+
+    async def fetch(self, url, until=None):
+        self.fetched += 1
+        return self.body
+
+    async def parse(self, page, parse, *args, restaurant=None):
+        return parse(page, *args)
+
+
+class TestWeeklyMenu:
+    def setup_method(self):
+        WeeklyMenuMixin.weekly_menus.clear()
+        WeeklyMenuMixin.refetched_at.clear()
+        SafeRestaurant.breakers.clear()
+
+    def test_parse_all_days_at_once(self):
+        restaurant = TOTORestaurant(None)
+        restaurant.content = restaurant.parser(TOTO_PAGE)
+
+        week = restaurant.parse_week()
+
+        assert sorted(week) == [0, 1, 2, 3]
+        assert week[1].foods == ["Utorok polievka", "Utorok jedlo"]
+
+    @pytest.mark.asyncio
+    async def test_page_is_fetched_once_a_week(self):
+        session = FakePageSession(TOTO_PAGE)
+        menus = [await TOTORestaurant(session).retrieve_menu(day) for day in range(4)]
+
+        assert session.fetched == 1
+        assert menus[3].foods == ["Štvrtok polievka"]
+
+    @pytest.mark.asyncio
+    async def test_missing_day_is_fetched_again_once(self):
+        session = FakePageSession(TOTO_PAGE)
+        menus = [await TOTORestaurant(session).retrieve_menu(4) for _ in range(3)]
+
+        assert session.fetched == 2
+        assert [menu.foods for menu in menus] == [[], [], []]
+
+    @pytest.mark.asyncio
+    async def test_missing_day_does_not_open_circuit(self):
+        session = FakePageSession(TOTO_PAGE)
+        restaurant = SafeRestaurant(TOTORestaurant(session))
+        for _ in range(CIRCUIT_FAILURES + 1):
+            await restaurant.retrieve_menu(4)
+
+        menu = await restaurant.retrieve_menu(0)
+
+        assert not menu.failed
+        assert SafeRestaurant.breakers[restaurant.restaurant.name].state == "closed"
+
+    @pytest.mark.asyncio
+    async def test_broken_page_is_failure(self):
+        session = FakePageSession("<h1>We moved!</h1>")
+        restaurant = SafeRestaurant(TOTORestaurant(session))
+
+        menu = await restaurant.retrieve_menu(0)
+
+        assert menu.failed
+        assert "Check menu yourself" in menu.foods[0]
+        assert SafeRestaurant.breakers[restaurant.restaurant.name].failures == 1
+
+
 MENU_1 = """*Restaurant A*
 1. Food 1 (4.5€)
 2. Food 2"""
@@ -138,6 +513,24 @@ FORMATTED_MENU_2 = """*Obedy v štvrtok 10.08.2017*
 *Restaurant B*
 1. Food 3"""
 
+SME_PAGE = """<html><body>
+<div class="dnesne_menu">
+<div class="jedlo_polozka">Polievka</div>
+<div class="jedlo_polozka">Rezeň</div>
+</div>
+<footer><script>var tracking = 1;</script></footer>
+</body></html>"""
+
+TOTO_PAGE = """<html><body>
+<div class="container">Navigation</div>
+<div class="container">
+<div class="pb-6"><p>Pondelok polievka</p><p></p></div>
+<div class="pb-6"><p>Utorok polievka</p><p>Utorok jedlo</p></div>
+<div class="pb-6"><p>Streda polievka</p></div>
+<div class="pb-6"><p>Štvrtok polievka</p></div>
+</div>
+</body></html>"""
+
 DON_FB_MESSAGE = """Dobre ranko vsetkym priatelom a znamym prajeme:)
 
 a....nove obedove menu na tento tyzden prinasame...;)
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, time, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from scheduler import PrefetchScheduler, ScrapeScheduler, parse_times
+from tests.fakes import FakeSafeRestaurant
+
+
+def test_parse_times_sorts_times():
+    assert parse_times("09:40, 09:15") == [time(9, 15), time(9, 40)]
+
+
+class TestPrefetchScheduler:
+    def setup_method(self):
+        self.runs = []
+
+        async def job():
+            self.runs.append(1)
+
+        self.scheduler = PrefetchScheduler(
+            [time(9, 15), time(9, 40)], job, is_work_day=lambda: True
+        )
+
+    def test_next_run_is_later_today(self):
+        now = datetime(2017, 8, 10, 9, 20)
+        assert self.scheduler.next_run(now) == datetime(2017, 8, 10, 9, 40)
+
+    def test_next_run_is_in_time_zone_of_clock(self):
+        zone = ZoneInfo("Europe/Bratislava")
+        now = datetime(2017, 8, 10, 7, 20, tzinfo=timezone.utc).astimezone(zone)
+        next_run = self.scheduler.next_run(now)
+
+        assert next_run == datetime(2017, 8, 10, 9, 40, tzinfo=zone)
+        assert next_run.astimezone(timezone.utc).hour == 7
+
+    def test_next_run_is_tomorrow_after_last_time(self):
+        now = datetime(2017, 8, 10, 9, 40)
+        assert self.scheduler.next_run(now) == datetime(2017, 8, 11, 9, 15)
+
+    @pytest.mark.asyncio
+    async def test_remembers_last_success(self):
+        await self.scheduler.run_job()
+
+        assert self.runs == [1]
+        assert self.scheduler.last_success == self.scheduler.last_run
+        assert self.scheduler.status()["last_error"] is None
+
+    @pytest.mark.asyncio
+    async def test_remembers_failure(self):
+        async def broken():
+            raise ValueError()
+
+        self.scheduler.job = broken
+        await self.scheduler.run_job()
+
+        assert self.scheduler.last_success is None
+        assert self.scheduler.last_error == "ValueError()"
+
+
+class TestScrapeScheduler:
+    def setup_method(self):
+        self.started = []
+        FakeSafeRestaurant.max_active = 0
+
+    @pytest.mark.asyncio
+    async def test_restaurants_of_offices_are_shared_and_limited(self):
+        scheduler = ScrapeScheduler(limit=2)
+        office_a = [FakeSafeRestaurant(name, self.started) for name in "abc"]
+        office_b = [FakeSafeRestaurant(name, self.started) for name in "cd"]
+
+        await asyncio.gather(
+            *[scheduler.retrieve_menu(r, 0) for r in office_a + office_b]
+        )
+
+        assert sorted(self.started) == ["a", "b", "c", "d"]
+        assert FakeSafeRestaurant.max_active == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_menu_is_scraped_again(self):
+        scheduler = ScrapeScheduler()
+        restaurant = FakeSafeRestaurant("a", self.started, failed=True)
+
+        await scheduler.retrieve_menu(restaurant, 0)
+        await scheduler.retrieve_menu(restaurant, 0)
+
+        assert self.started == ["a", "a"]
+
+    def test_slowest_and_most_popular_go_first(self):
+        scheduler = ScrapeScheduler(popularity={"b": 2})
+        scheduler.record("a", 1.0)
+        scheduler.record("c", 3.0)
+        scheduler.record("b", 1.0)
+        restaurants = [FakeSafeRestaurant(name, []) for name in "abcd"]
+
+        ordered = scheduler.order(restaurants)
+
+        assert [r.name for r in ordered] == ["d", "c", "b", "a"]
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from datetime import date
+
+import pytest
+
+from restaurants import Menu
+from scheduler import ScrapeScheduler
+from shared import RedisBackend, SharedMenus, SQLiteBackend, create_backend
+from tests.fakes import FakeSafeRestaurant
+
+TODAY = date(2017, 8, 10)
+
+
+class FakeRedis:
+    """Local stand-in for the few redis.Redis methods RedisBackend uses"""
+
+    def __init__(self) -> None:
+        self.values = {}
+
+    def get(self, key):
+        value, expires = self.values.get(key, (None, 0))
+        return value.encode() if value and expires > time.time() else None
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self.get(key) is not None:
+            return None
+        self.values[key] = (value, time.time() + ex)
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class BrokenBackend:
+    def __getattr__(self, name):
+        def fail(*args):
+            raise ConnectionError()
+
+        return fail
+
+
+class Scraper:
+    def __init__(self, failed=False, foods=("Rezeň",)) -> None:
+        self.calls = 0
+        self.failed = failed
+        self.foods = foods
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        menu = Menu("TOTO")
+        for food in self.foods:
+            menu.add_item(food, "6.90")
+        menu.failed = self.failed
+        return menu
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "shared.sqlite3"))
+    return RedisBackend(FakeRedis())
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_scrapes(backend):
+    workers = [SharedMenus(backend, poll=0.01) for _ in range(3)]
+    scrape = Scraper()
+
+    menus = await asyncio.gather(
+        *[worker.retrieve_menu("TOTO", 3, TODAY, scrape) for worker in workers]
+    )
+
+    assert scrape.calls == 1
+    assert [list(menu.foods) for menu in menus] == [["Rezeň"]] * 3
+
+
+@pytest.mark.asyncio
+async def test_failed_menu_is_not_shared(backend):
+    shared = SharedMenus(backend, poll=0.01)
+    scrape = Scraper(failed=True)
+
+    await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+    await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+
+    assert scrape.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_empty_menu_is_not_shared(backend):
+    shared = SharedMenus(backend, poll=0.01)
+    scrape = Scraper(foods=())
+
+    await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+    await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+
+    assert scrape.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_broken_entry_is_scraped_again(backend):
+    backend.set("menu:2017-08-10:3:TOTO", "{broken", 60)
+    shared = SharedMenus(backend, poll=0.01)
+    scrape = Scraper()
+
+    menu = await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+
+    assert scrape.calls == 1
+    assert list(menu.foods) == ["Rezeň"]
+
+
+@pytest.mark.asyncio
+async def test_gives_up_waiting_for_stuck_worker(backend):
+    backend.acquire("lock:menu:2017-08-10:3:TOTO", "other", 30)
+    shared = SharedMenus(backend, wait=0.05, poll=0.01)
+    scrape = Scraper()
+
+    menu = await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+
+    assert scrape.calls == 1
+    assert list(menu.foods) == ["Rezeň"]
+
+
+@pytest.mark.asyncio
+async def test_scrapes_locally_when_backend_fails():
+    shared = SharedMenus(BrokenBackend(), poll=0.01)
+    scrape = Scraper()
+
+    menu = await shared.retrieve_menu("TOTO", 3, TODAY, scrape)
+
+    assert scrape.calls == 1
+    assert list(menu.foods) == ["Rezeň"]
+
+
+@pytest.mark.asyncio
+async def test_schedulers_of_workers_share_menus(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "shared.sqlite3"))
+    scrape = Scraper()
+    restaurant = FakeSafeRestaurant("TOTO", scrape=scrape)
+    schedulers = [
+        ScrapeScheduler(shared=SharedMenus(backend, poll=0.01)) for _ in range(2)
+    ]
+
+    await asyncio.gather(*[s.retrieve_menu(restaurant, 3) for s in schedulers])
+
+    assert scrape.calls == 1
+
+
+def test_create_backend():
+    assert create_backend("") is None
+    assert isinstance(create_backend("sqlite:menus.sqlite3"), SQLiteBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached://localhost")
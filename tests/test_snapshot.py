@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from restaurants import NO_PRICE, FormattedMenus, Menu
+from snapshot import load_snapshot, save_snapshot
+
+
+def make_menus(today):
+    menu = Menu("TOTO")
+    menu.add_item("Polievka")
+    menu.add_item("Rezeň", "6.90")
+    stale = Menu("Avalon").as_stale(datetime(2017, 8, 9, 11, 30))
+    return FormattedMenus([menu, stale], today=today)
+
+
+def test_snapshot_round_trip(tmp_path):
+    today = datetime(2017, 8, 10, 9, 15)
+    path = str(tmp_path / "menus.json")
+    save_snapshot(path, make_menus(today))
+
+    menus = load_snapshot(path, datetime(2017, 8, 10, 14, 0))
+
+    assert menus.today == today
+    assert list(menus.menus[0].foods) == ["Polievka", "Rezeň"]
+    assert list(menus.menus[0].prices) == [NO_PRICE, "6.90"]
+    assert menus.menus[1].stale_since == datetime(2017, 8, 9, 11, 30)
+    assert str(menus) == str(make_menus(today))
+
+
+def test_snapshot_of_other_day_is_ignored(tmp_path):
+    path = str(tmp_path / "menus.json")
+    save_snapshot(path, make_menus(datetime(2017, 8, 10, 9, 15)))
+
+    assert load_snapshot(path, datetime(2017, 8, 11, 9, 15)) is None
+
+
+def test_missing_or_broken_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "menus.json"
+    assert load_snapshot(str(path), datetime.today()) is None
+    path.write_text("{")
+    assert load_snapshot(str(path), datetime.today()) is None